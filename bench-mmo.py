@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+# libs
+import numpy as np
+import mmo
+from mmo.minimize import Iteration
+from mmo.domain import RegionView
+from time import perf_counter
+import argparse
+import itertools
+import platform
+import datetime
+import json
+import sys
+
+####################################################################################################
+# config
+####################################################################################################
+parser = argparse.ArgumentParser(description = 'microbenchmarks of the mmo hot paths, times in seconds per operation')
+parser.add_argument('--sizes', type = float, nargs = '+', default = [1e3, 1e4, 1e5, 1e6], help = 'numbers of regions')
+parser.add_argument('--no-list', action = 'store_true', help = 'skip the list based region set reference')
+parser.add_argument('--dims', type = int, nargs = '+', default = [1, 2, 5, 10, 20], help = 'dimensions for bisect and Cma')
+parser.add_argument('--repeat', type = int, default = 3, help = 'repetitions, the best is kept')
+parser.add_argument('--out', default = 'results/bench-mmo.json', help = 'json output')
+parser.add_argument('--compare', default = None, help = 'earlier json output to compare with')
+args = parser.parse_args()
+SIZES = [int(n) for n in args.sizes]
+DIMS = args.dims
+DIM = 2
+N_OPS = 10**5
+
+####################################################################################################
+# fcts
+####################################################################################################
+def timed(fct, n_rep):
+    # best over args.repeat of the mean time per call of fct, n_rep calls each
+    best = np.inf
+    for r in range(args.repeat):
+        t = perf_counter()
+        for k in range(n_rep):
+            fct()
+        best = min(best, (perf_counter() - t) / n_rep)
+    return(best)
+
+def grow_domain(dim, n):
+    # domain of n regions by penalized bisections of the top region
+    dom = mmo.Domain(ll = [0] * dim, ur = [1] * dim)
+    for k in range(n - 1):
+        rs = dom.get_top_region()
+        r1, r2 = rs.bisect(p = None)
+        dom.replace(regions_in = [r1, r2], regions_out = [rs])
+    return(dom)
+
+def cycle(dom):
+    rs = dom.get_top_region()
+    r1, r2 = rs.bisect(p = None)
+    dom.replace(regions_in = [r1, r2], regions_out = [rs])
+
+# reference: the region set as a plain list, as before the heap; entries with the score as a plain
+# attribute, so the scan costs what the former list of region objects did, not a store lookup per region
+class ListEntry:
+    __slots__ = ('score', 'region')
+
+    def __init__(self, region):
+        self.score = region.score
+        self.region = region
+
+def list_get_top_region(entries):
+    return(max(entries, key = lambda e: e.score))
+
+def list_cycle(entries):
+    e = list_get_top_region(entries)
+    r1, r2 = e.region.bisect(p = None)
+    entries.remove(e)
+    entries += [ListEntry(r1), ListEntry(r2)]
+
+results = []
+def record(name, t, **params):
+    results.append({'name': name, 'params': params, 'time': t})
+    print(f'{name:<24} {json.dumps(params):<32} {1e6 * t:>12.3f} us')
+
+####################################################################################################
+# domain: lookup, top region, replace; the list reference scans all regions for the top one and
+# replaces with list.remove, the heap pops and pushes, both bisect in the same region store
+####################################################################################################
+rng = np.random.default_rng(0)
+for n in SIZES:
+    dom = grow_domain(DIM, n)
+    n_rep = max(10, min(N_OPS, 10**7 // n))
+    x = rng.random((n_rep, DIM))
+    points = itertools.cycle(x)
+    record('get_region_with_point', timed(lambda: dom.get_region_with_point(next(points)), n_rep), regions = n)
+    record('locate', timed(lambda: dom.locate(x), 1) / n_rep, regions = n)
+    record('get_top_region', timed(dom.get_top_region, n_rep), regions = n)
+    record('bisect_replace', timed(lambda: cycle(dom), n_rep), regions = n)
+    if not args.no_list:
+        # a domain of its own, the list cycle bisects regions without replace
+        entries = [ListEntry(r) for r in grow_domain(DIM, n).regions]
+        n_rep = max(1, min(100, 10**6 // n))
+        record('get_top_region_list', timed(lambda: list_get_top_region(entries), n_rep), regions = n)
+        record('bisect_replace_list', timed(lambda: list_cycle(entries), n_rep), regions = n)
+
+####################################################################################################
+# bisect by dimension
+####################################################################################################
+for dim in DIMS:
+    dom = grow_domain(dim, 1000)
+    record('bisect', timed(lambda: dom.get_top_region().bisect(p = None), 10**4), dim = dim)
+
+####################################################################################################
+# Cma per generation, trivial objective
+####################################################################################################
+for dim in DIMS:
+    region = mmo.Domain(ll = [-1] * dim, ur = [1] * dim).get_top_region()
+    for vectorized in [False, True]:
+        f = (lambda X: np.sum(X**2, axis = 1)) if vectorized else (lambda x: np.sum(x**2))
+        n_gen = 100
+        def run():
+            cma = mmo.Cma(f = f, region = region, max_gen = n_gen, vectorized = vectorized)
+            return(cma.n_fct_eval / mmo.ls.popsize(dim))
+        gens = run()
+        record('cma_generation', timed(run, 3) / gens, dim = dim, vectorized = vectorized)
+
+####################################################################################################
+# per-iteration snapshot: read-only Iteration record, and full copy of the minimizer
+####################################################################################################
+for n in [n for n in SIZES if n <= 10**5]:
+    dom = grow_domain(DIM, n)
+    mmm = mmo.MultiModalMinimizer(f = lambda x: 0.0, domain = dom)
+    rs = dom.get_top_region()
+    record('snapshot_iteration', timed(lambda: Iteration(0, 0, 0, RegionView(region = rs), rs.midpoint, 0.0, mmm.domain_view), N_OPS), regions = n)
+    record('snapshot_full_copy', timed(mmm.copy, max(1, min(100, 10**5 // n))), regions = n)
+
+####################################################################################################
+# output
+####################################################################################################
+meta = {'date': datetime.datetime.now().isoformat(), 'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'processor': platform.processor(), 'argv': sys.argv[1:]}
+with open(args.out, 'w') as f:
+    json.dump({'meta': meta, 'results': results}, f, indent = 1)
+
+# ratio to an earlier run, > 1 is slower now
+if args.compare is not None:
+    with open(args.compare) as f:
+        old = {(r['name'], json.dumps(r['params'], sort_keys = True)): r['time'] for r in json.load(f)['results']}
+    print()
+    print(f'{"benchmark":<24} {"params":<32} {"now/before":>12}')
+    for r in results:
+        key = (r['name'], json.dumps(r['params'], sort_keys = True))
+        if key in old:
+            print(f'{r["name"]:<24} {json.dumps(r["params"]):<32} {r["time"] / old[key]:>12.2f}')
+
@@ -1,26 +1,42 @@
 # libs
 import numpy as np
-from modules import hq_run_n
+from modules import hq_iter_n
+from modules_cec13.cec2013 import CEC2013
 
 # fct
 def geo_mean(x):
     r = np.exp(np.mean(np.log(x)))
     return(r)
 
-# run
-for PROBLEM in [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20]:
-    r = hq_run_n(cmd = f'python3 cec13-execute-p1-20.py {PROBLEM}', n = 50, pp = 'last_2_float')
-    print(f'n runs = {len(r)}')
-    r = np.array(r)
-    print(f'PROBLEM: {np.mean(r[:, 0])}')
-    print(f'PEAK RATE: {np.mean(r[:, 1])}')
-    print()
-
-    with open("results/results-cec13.txt", "a") as f:
-        f.write(f'PROBLEM: {np.mean(r[:, 0])}, PEAK RATE: {np.mean(r[:, 1])}\n')
-    
-
-
-
-
+def cost(problem):
+    # expected run time, by budget and then dimension
+    cec = CEC2013(problem)
+    return((cec.get_maxfes(), cec.get_dimension(), problem))
+
+# config
+PROBLEMS = [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20]
+N_RUNS = 50
+
+# all problem x run tasks in one sweep, longest first
+tasks = [(PROBLEM, k) for PROBLEM in sorted(PROBLEMS, key = cost, reverse = True) for k in range(N_RUNS)]
+cmds = [f'python3 cec13-execute-p1-20.py {PROBLEM}' for PROBLEM, k in tasks]
+
+# aggregate each problem as soon as all its runs are in
+r = {PROBLEM: [] for PROBLEM in PROBLEMS}
+n_left = {PROBLEM: N_RUNS for PROBLEM in PROBLEMS}
+for result in hq_iter_n(cmd = cmds):
+    PROBLEM = tasks[result.task][0]
+    n_left[PROBLEM] -= 1
+    if result.ok:
+        r[PROBLEM] += [result.value['peak_rate']]
+    else:
+        print(f'PROBLEM {PROBLEM}: run failed: {result.error}')
+    if n_left[PROBLEM] == 0:
+        print(f'n runs = {len(r[PROBLEM])}')
+        print(f'PROBLEM: {PROBLEM}')
+        print(f'PEAK RATE: {np.mean(r[PROBLEM])}')
+        print()
+
+        with open("results/results-cec13.txt", "a") as f:
+            f.write(f'PROBLEM: {PROBLEM}, PEAK RATE: {np.mean(r[PROBLEM])}\n')
 
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+# libs
+import numpy as np
+import mmo.benchmark
+import sys
+
+####################################################################################################
+# config
+####################################################################################################
+PROBLEMS = list(range(1, 21))
+N_RUNS = 50
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+SEED = 0
+
+####################################################################################################
+# run
+####################################################################################################
+table = mmo.benchmark.run_cec13(problems = PROBLEMS, n_runs = N_RUNS, workers = WORKERS, seed = SEED)
+np.save('results/results-cec13-local.npy', table)
+print(mmo.benchmark.format_table(mmo.benchmark.summary(table)))
+
@@ -4,14 +4,16 @@
 import numpy as np
 import numpy.linalg as la
 import mmo 
-from modules_cec13.cec2013 import how_many_goptima, CEC2013
+from modules_cec13.cec2013 import how_many_goptima_all, CEC2013
 from time import time
 import sys
+import os
 
 ####################################################################################################
 # config
 ####################################################################################################
 PROBLEM = int(sys.argv[1])
+EVENTS = sys.argv[2] if len(sys.argv) > 2 else None
 
 ####################################################################################################
 # objective function and domain
@@ -38,7 +40,7 @@ UR = []
 for d in range(DIM):
     LL += [cec.get_lbound(d)]
     UR += [cec.get_ubound(d)]
-f = lambda x: -cec.evaluate(x)
+f = lambda x: -cec.evaluate_batch(x)
 
 dom = mmo.Domain(ll = LL, ur = UR)
 
@@ -53,10 +55,15 @@ print()
 ####################################################################################################
 # run
 ####################################################################################################
-mmm = mmo.MultiModalMinimizer(f = f, domain = dom, budget = BUDGET, verbose = 1)
+# progress as json lines in EVENTS, if given
+sink = None if EVENTS is None else mmo.JsonlSink(path = EVENTS)
+mmm = mmo.MultiModalMinimizer(f = f, domain = dom, budget = BUDGET, verbose = 1, vectorized = True, events = sink)
 for k, m in enumerate(mmm):
-    print(m)
-    print()
+    pass
+if sink is not None:
+    sink.close()
+print(m)
+print()
 
 #m.domain.plot(x = solutions)
 
@@ -65,13 +72,8 @@ for k, m in enumerate(mmm):
 ####################################################################################################
 CEC_f = CEC2013(PROBLEM)
 n_optima = CEC_f.get_no_goptima()
-count = np.zeros((5))
 x = m.domain.solutions()
-count[0], seeds = how_many_goptima(x, CEC_f, 1e-1)
-count[1], seeds = how_many_goptima(x, CEC_f, 1e-2)
-count[2], seeds = how_many_goptima(x, CEC_f, 1e-3)
-count[3], seeds = how_many_goptima(x, CEC_f, 1e-4)
-count[4], seeds = how_many_goptima(x, CEC_f, 1e-5)
+count, seeds = how_many_goptima_all(x, CEC_f, [1e-1, 1e-2, 1e-3, 1e-4, 1e-5])
 peake_rate = np.mean(count) / n_optima
 
 print("#####################")
@@ -80,9 +82,7 @@ print("#####################")
 print(PROBLEM, peake_rate)
 print()
 
-
-
-
-
-
-
+# structured result, when run by modules.hq_iter_n
+if 'HQ_RESULT_DIR' in os.environ:
+    from modules.hq import hq_write_result
+    hq_write_result({'problem': PROBLEM, 'peak_rate': peake_rate, 'count': count.tolist(), 'n_fct_calls': mmm.n_fct_calls})
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# libs
+import numpy as np
+import mmo.benchmark as bm
+import argparse
+import platform
+import datetime
+import os
+import sys
+
+####################################################################################################
+# config
+####################################################################################################
+parser = argparse.ArgumentParser(description = 'CEC2013 regression runs against a stored baseline')
+parser.add_argument('--smoke', action = 'store_true', help = 'reduced problem set, runs and budgets')
+parser.add_argument('--workers', type = int, default = 1)
+parser.add_argument('--baseline', default = None, help = 'baseline json, default results/baseline-cec13[-smoke].json')
+parser.add_argument('--update-baseline', action = 'store_true', help = 'store this run as the baseline')
+parser.add_argument('--out', default = None, help = 'json output of this run')
+parser.add_argument('--alpha', type = float, default = 0.05, help = 'significance level of the one-sided tests')
+parser.add_argument('--slowdown', type = float, default = 1.25, help = 'median wall time ratio flagged as slowdown')
+args = parser.parse_args()
+
+# fixed seeds: every run is seeded from SEED, so the runs are the same on every invocation
+SEED = 2013
+if args.smoke:
+    PROBLEMS = [1, 4, 6, 10, 11, 12]
+    N_RUNS = 5
+    BUDGET_SCALE = 0.1
+else:
+    PROBLEMS = list(range(1, 21))
+    N_RUNS = 10
+    BUDGET_SCALE = 1.0
+name = 'cec13-smoke' if args.smoke else 'cec13'
+baseline_path = args.baseline if args.baseline is not None else f'results/baseline-{name}.json'
+out_path = args.out if args.out is not None else f'results/regression-{name}.json'
+
+####################################################################################################
+# run
+####################################################################################################
+table = bm.run_cec13(problems = PROBLEMS, n_runs = N_RUNS, workers = args.workers, seed = SEED, budget_scale = BUDGET_SCALE, fresh = True)
+meta = {'date': datetime.datetime.now().isoformat(), 'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'seed': SEED, 'n_runs': N_RUNS, 'budget_scale': BUDGET_SCALE, 'workers': args.workers}
+bm.save_table(table, out_path, **meta)
+s = bm.summary(table)
+print(bm.format_table(s))
+
+# efficiency: mean peak rate over the accuracy levels per 10^5 evaluations and per second
+print(f'{"problem":>8} {"PR/1e5 fct":>12} {"PR/s":>10}')
+for r in s:
+    pr = np.mean(r['peak_rate'])
+    print(f'{r["problem"]:>8} {1e5 * pr / r["n_fct_calls"]:>12.4f} {pr / r["wall_time"]:>10.4f}')
+print()
+
+####################################################################################################
+# baseline
+####################################################################################################
+if args.update_baseline:
+    bm.save_table(table, baseline_path, **meta)
+    print(f'baseline stored: {baseline_path}')
+    sys.exit(0)
+if not os.path.exists(baseline_path):
+    print(f'no baseline: {baseline_path}, store one with --update-baseline')
+    sys.exit(0)
+baseline, baseline_meta = bm.load_table(baseline_path)
+print(f'baseline: {baseline_path} ({baseline_meta.get("date")})')
+
+# runs share the cpus with the other workers, wall times of another number of workers are not comparable
+baseline_workers = baseline_meta.get('workers', 1)
+same_workers = baseline_workers == args.workers
+if not same_workers:
+    print(f'WARNING: wall_time not checked, {args.workers} workers against {baseline_workers} in the baseline')
+flags = bm.compare(table, baseline, alpha = args.alpha, slowdown = args.slowdown, wall_time = same_workers)
+for problem, what, before, now in flags:
+    print(f'REGRESSION problem {problem}: {what} {before:.6g} -> {now:.6g}')
+if len(flags) == 0:
+    print('no regressions')
+sys.exit(1 if len(flags) > 0 else 0)
+
@@ -1,3 +1,6 @@
 from mmo.domain import Domain
 from mmo.minimize import MultiModalMinimizer
 from mmo.ls import Cma
+from mmo.cache import FctCache
+from mmo.checkpoint import Checkpoint
+from mmo.events import Event, EventLog, JsonlSink
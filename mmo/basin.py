@@ -0,0 +1,50 @@
+# libs
+import numpy as np
+from scipy.spatial import cKDTree
+
+# classes
+class KnownPoints:
+    # known solutions: a kd-tree, rebuilt in batches, plus a linear scan over the points added since
+    def __init__(self, dim = None, points = None, radius = 2.0, shrink = 0.1):
+        assert(dim is not None)
+        self.dim = dim
+        self.radius = radius
+        self.shrink = shrink
+        self.tree = None
+        self.n_tree = 0
+        self.points = np.zeros((0, dim))
+        self.recent = []
+        if points is not None and points.shape[0] > 0:
+            self.points = np.array(points, dtype = float)
+            self.rebuild()
+
+    def rebuild(self):
+        if len(self.recent) > 0:
+            self.points = np.vstack([self.points] + self.recent)
+            self.recent = []
+        self.tree = cKDTree(self.points)
+        self.n_tree = self.points.shape[0]
+
+    def add(self, p):
+        self.recent += [np.array(p, dtype = float).reshape(1, -1)]
+        if len(self.recent) > max(32, int(np.sqrt(self.n_tree))):
+            self.rebuild()
+
+    def distance(self, x):
+        # distance from x to the nearest known point
+        d = np.inf
+        if self.tree is not None:
+            d, _ = self.tree.query(x)
+        if len(self.recent) > 0:
+            d = min(d, np.min(np.linalg.norm(np.vstack(self.recent) - x, axis = 1)))
+        return(d)
+
+    def heading_to_known(self, mean, spread, spread0):
+        # a converging search (spread shrunk to shrink * spread0) whose mean lies within radius * spread of a known point
+        if spread > self.shrink * spread0:
+            return(False)
+        return(self.distance(mean) <= self.radius * spread)
+
+    def __len__(self):
+        return(self.n_tree + len(self.recent))
+
@@ -0,0 +1,122 @@
+# libs
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+import resource
+import json
+import mmo
+
+# accuracy levels of the CEC2013 niching competition
+ACCURACIES = [1e-1, 1e-2, 1e-3, 1e-4, 1e-5]
+
+# one row per problem and run, peak_rss in MB
+RESULT_DTYPE = np.dtype([('problem', int), ('run', int), ('peak_rate', float, (len(ACCURACIES),)), ('n_fct_calls', int), ('n_solutions', int), ('wall_time', float), ('peak_rss', float)])
+
+# fcts
+def run_cec13_one(problem, run = 0, seed = None, budget_scale = 1.0):
+    # one run of MultiModalMinimizer on CEC2013 problem, as in cec13-execute-p1-20.py, returns a RESULT_DTYPE row
+    from modules_cec13.cec2013 import CEC2013, how_many_goptima_all
+    t = perf_counter()
+    cec = CEC2013(problem)
+    dim = cec.get_dimension()
+    ll = [cec.get_lbound(d) for d in range(dim)]
+    ur = [cec.get_ubound(d) for d in range(dim)]
+    f = lambda x: -cec.evaluate_batch(x)
+    budget = max(1, int(budget_scale * cec.get_maxfes()))
+    mmm = mmo.MultiModalMinimizer(f = f, domain = mmo.Domain(ll = ll, ur = ur), budget = budget, vectorized = True, seed = seed)
+    for m in mmm:
+        pass
+    count, seeds = how_many_goptima_all(mmm.domain.solutions(), cec, ACCURACIES)
+    row = np.zeros((), dtype = RESULT_DTYPE)
+    row['problem'] = problem
+    row['run'] = run
+    row['peak_rate'] = count / cec.get_no_goptima()
+    row['n_fct_calls'] = mmm.n_fct_calls
+    row['n_solutions'] = mmm.domain.solutions().shape[0]
+    row['wall_time'] = perf_counter() - t
+    row['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return(row)
+
+def run_cec13(problems = range(1, 21), n_runs = 50, workers = 1, seed = 0, budget_scale = 1.0, fresh = False):
+    # the problems x runs matrix in a process pool, every run with its own seed sequence spawned from seed
+    # fresh: every run in a newly forked process, so that peak_rss is the peak of the run (on top of the
+    # parent's memory at the fork), otherwise it is the peak of the worker process so far
+    # returns a RESULT_DTYPE array sorted by problem and run
+    tasks = [(problem, run) for problem in problems for run in range(n_runs)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    rows = []
+    if workers == 1 and not fresh:
+        for (problem, run), ss in zip(tasks, seeds):
+            rows += [run_cec13_one(problem, run, ss, budget_scale)]
+    elif fresh:
+        with mp.get_context('fork').Pool(processes = workers, maxtasksperchild = 1) as pool:
+            rows = pool.starmap(run_cec13_one, [(problem, run, ss, budget_scale) for (problem, run), ss in zip(tasks, seeds)], chunksize = 1)
+    else:
+        with ProcessPoolExecutor(max_workers = workers, mp_context = mp.get_context('fork')) as pool:
+            futures = [pool.submit(run_cec13_one, problem, run, ss, budget_scale) for (problem, run), ss in zip(tasks, seeds)]
+            for future in as_completed(futures):
+                rows += [future.result()]
+    table = np.array(rows, dtype = RESULT_DTYPE).reshape(-1)
+    return(table[np.lexsort((table['run'], table['problem']))])
+
+def summary(table):
+    # mean over the runs of each problem, peak_rate per accuracy level, run holds the number of runs, peak_rss the max
+    problems = np.unique(table['problem'])
+    s = np.zeros(problems.shape[0], dtype = RESULT_DTYPE)
+    for k, problem in enumerate(problems):
+        t = table[table['problem'] == problem]
+        s[k]['problem'] = problem
+        s[k]['run'] = t.shape[0]
+        s[k]['peak_rate'] = np.mean(t['peak_rate'], axis = 0)
+        s[k]['n_fct_calls'] = np.mean(t['n_fct_calls'])
+        s[k]['n_solutions'] = np.mean(t['n_solutions'])
+        s[k]['wall_time'] = np.mean(t['wall_time'])
+        s[k]['peak_rss'] = np.max(t['peak_rss'])
+    return(s)
+
+def format_table(table):
+    s = f'{"problem":>8} {"runs":>5} ' + ' '.join(f'{"PR@" + format(a, ".0e"):>9}' for a in ACCURACIES) + f' {"fct calls":>10} {"solutions":>10} {"time[s]":>8} {"rss[MB]":>8}\n'
+    for r in table:
+        s += f'{r["problem"]:>8} {r["run"]:>5} ' + ' '.join(f'{v:>9.3f}' for v in r['peak_rate']) + f' {r["n_fct_calls"]:>10} {r["n_solutions"]:>10} {r["wall_time"]:>8.2f} {r["peak_rss"]:>8.1f}\n'
+    return(s)
+
+def save_table(table, path, **meta):
+    rows = [{name: np.asarray(r[name]).tolist() for name in RESULT_DTYPE.names} for r in table]
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'rows': rows}, f, indent = 1)
+
+def load_table(path):
+    with open(path) as f:
+        d = json.load(f)
+    table = np.zeros(len(d['rows']), dtype = RESULT_DTYPE)
+    for k, r in enumerate(d['rows']):
+        for name in RESULT_DTYPE.names:
+            table[k][name] = r.get(name, 0)
+    return(table, d['meta'])
+
+def compare(table, baseline, alpha = 0.05, slowdown = 1.25, memory = 1.2, wall_time = True):
+    # per problem, flags of significant changes to the worse against baseline: lower peak_rate at an accuracy level
+    # or longer wall_time (one-sided Mann-Whitney U at level alpha, time also by more than the factor slowdown),
+    # more evaluations, or a peak_rss larger by more than the factor memory
+    # wall_time = False: no time check, for runs not comparable in time (e.g. another number of workers)
+    from scipy.stats import mannwhitneyu
+    flags = []
+    for problem in np.unique(table['problem']):
+        t = table[table['problem'] == problem]
+        b = baseline[baseline['problem'] == problem]
+        if b.shape[0] == 0:
+            continue
+        for k, accuracy in enumerate(ACCURACIES):
+            x = t['peak_rate'][:, k]
+            y = b['peak_rate'][:, k]
+            if np.mean(x) < np.mean(y) and (np.ptp(np.concatenate((x, y))) > 0) and mannwhitneyu(x, y, alternative = 'less').pvalue < alpha:
+                flags += [(int(problem), f'peak_rate@{accuracy:.0e}', float(np.mean(y)), float(np.mean(x)))]
+        ratio = np.median(t['wall_time']) / np.median(b['wall_time'])
+        if wall_time and ratio > slowdown and mannwhitneyu(t['wall_time'], b['wall_time'], alternative = 'greater').pvalue < alpha:
+            flags += [(int(problem), 'wall_time', float(np.median(b['wall_time'])), float(np.median(t['wall_time'])))]
+        if np.mean(t['n_fct_calls']) > np.mean(b['n_fct_calls']):
+            flags += [(int(problem), 'n_fct_calls', float(np.mean(b['n_fct_calls'])), float(np.mean(t['n_fct_calls'])))]
+        if np.max(t['peak_rss']) > memory * np.max(b['peak_rss']):
+            flags += [(int(problem), 'peak_rss', float(np.max(b['peak_rss'])), float(np.max(t['peak_rss'])))]
+    return(flags)
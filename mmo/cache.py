@@ -0,0 +1,57 @@
+# libs
+import numpy as np
+from collections import OrderedDict
+
+# classes
+class FctCache:
+    # LRU cache of objective values, keyed on the exact coordinates or, with tol, on coordinates quantized to tol
+    def __init__(self, maxsize = 10**6, tol = None):
+        assert(maxsize > 0)
+        assert(tol is None or tol > 0)
+        self.maxsize = maxsize
+        self.tol = tol
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, x):
+        x = np.asarray(x, dtype = float)
+        if self.tol is None:
+            return(x.tobytes())
+        return(np.round(x / self.tol).astype(np.int64).tobytes())
+
+    def get(self, x):
+        k = self.key(x)
+        if k in self.table:
+            self.table.move_to_end(k)
+            self.hits += 1
+            return(self.table[k])
+        self.misses += 1
+        return(None)
+
+    def put(self, x, y):
+        k = self.key(x)
+        self.table[k] = y
+        self.table.move_to_end(k)
+        if len(self.table) > self.maxsize:
+            self.table.popitem(last = False)
+            self.evictions += 1
+
+    def hit_rate(self):
+        n = self.hits + self.misses
+        return(self.hits / n if n > 0 else 0.0)
+
+    def __len__(self):
+        return(len(self.table))
+
+    def __str__(self):
+        s = '## FctCache\n'
+        s += f'size: {len(self.table)} / {self.maxsize}\n'
+        s += f'tol: {self.tol}\n'
+        s += f'hits: {self.hits}\n'
+        s += f'misses: {self.misses}\n'
+        s += f'hit rate: {self.hit_rate()}\n'
+        s += f'evictions: {self.evictions}\n'
+        return(s)
+
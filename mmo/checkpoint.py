@@ -0,0 +1,61 @@
+# libs
+import numpy as np
+import os
+import glob
+
+# classes
+class Checkpoint:
+    # incremental checkpoints of a MultiModalMinimizer: every `every` iterations the domain rows added or
+    # changed since the previous checkpoint, the counters and the seed generator are written to
+    # path/ckpt-<n>.npz, resume applies all of them in order
+    def __init__(self, path = None, every = 100):
+        assert(path is not None)
+        assert(every > 0)
+        self.path = path
+        self.every = every
+        self.n_saved = 0
+        self.n0 = 0
+        self.s0 = 0
+        os.makedirs(path, exist_ok = True)
+
+    def attach(self, mmm):
+        # record the rows changed after their creation from now on
+        mmm.domain.store.dirty = []
+
+    def files(self):
+        return(sorted(glob.glob(os.path.join(self.path, 'ckpt-*.npz'))))
+
+    def __call__(self, mmm, force = False):
+        store = mmm.domain.store
+        if not force and mmm.iter % self.every != 0:
+            return
+
+        # write to a temporary file and rename, a crash leaves the previous checkpoints intact
+        fname = os.path.join(self.path, f'ckpt-{self.n_saved:06d}.npz')
+        tmp = fname + '.tmp'
+        with open(tmp, 'wb') as fh:
+            np.savez(fh, **mmm.get_state(n0 = self.n0, s0 = self.s0, dirty = store.dirty))
+        os.replace(tmp, fname)
+        self.n_saved += 1
+        self.n0 = store.n
+        self.s0 = store.n_sol
+        store.dirty = []
+
+    def resume(self, mmm):
+        # apply all checkpoints to a minimizer created with the same f, domain bounds and options
+        files = self.files()
+        for fname in files:
+            mmm.set_state(np.load(fname))
+        self.n_saved = len(files)
+        self.n0 = mmm.domain.store.n
+        self.s0 = mmm.domain.store.n_sol
+        mmm.domain.store.dirty = []
+        return(len(files) > 0)
+
+    def __str__(self):
+        s = '## Checkpoint\n'
+        s += f'path: {self.path}\n'
+        s += f'every: {self.every}\n'
+        s += f'n_saved: {self.n_saved}\n'
+        return(s)
+
@@ -1,152 +1,256 @@
 # libs
 import numpy as np
 import numpy.linalg as la
-from copy import deepcopy as copy
 import matplotlib.pyplot as plt
+from copy import deepcopy as copy
+import heapq
 
 # fcts
+def grow(a, n, fill):
+    # amortized O(1) append for the preallocated store arrays
+    if n <= a.shape[0]:
+        return(a)
+    b = np.full((max(n, 2 * a.shape[0]),) + a.shape[1:], fill, dtype = a.dtype)
+    b[:a.shape[0]] = a
+    return(b)
+
+STORE_COLUMNS = ['ll', 'ur', 'pid', 'score', 'penalty', 'axis', 'split', 'cut', 'child', 'live', 'order']
+
+def readonly(a):
+    a.flags.writeable = False
+    return(a)
 
 # classes
+class RegionStore:
+    # struct of arrays, row k holds region k and node k of the bsp tree of bisections
+    def __init__(self, dim = None, capacity = 64):
+        assert(dim is not None)
+        self.dim = dim
+        self.n = 0
+        self.ll = np.zeros((capacity, dim))
+        self.ur = np.zeros((capacity, dim))
+        self.pid = np.full(capacity, -1, dtype = int)
+        self.score = np.zeros(capacity)
+        self.penalty = np.zeros(capacity, dtype = int)
+
+        # tree: split axis/value, first child of the last bisection (cut) and of the linked one (child)
+        self.axis = np.full(capacity, -1, dtype = int)
+        self.split = np.zeros(capacity)
+        self.cut = np.full(capacity, -1, dtype = int)
+        self.child = np.full(capacity, -1, dtype = int)
+        self.live = np.zeros(capacity, dtype = bool)
+        self.order = np.full(capacity, -1, dtype = int)
+
+        # solutions, appended as they are inserted by bisections, pid is the row of the point of a region
+        self.n_sol = 0
+        self.sol = np.zeros((capacity, dim))
+
+        # rows changed after their creation, recorded for incremental checkpoints when not None
+        self.dirty = None
+
+    def allocate(self, m):
+        k = self.n
+        self.n += m
+        if self.n > self.ll.shape[0]:
+            self.ll = grow(self.ll, self.n, 0)
+            self.ur = grow(self.ur, self.n, 0)
+            self.pid = grow(self.pid, self.n, -1)
+            self.score = grow(self.score, self.n, 0)
+            self.penalty = grow(self.penalty, self.n, 0)
+            self.axis = grow(self.axis, self.n, -1)
+            self.split = grow(self.split, self.n, 0)
+            self.cut = grow(self.cut, self.n, -1)
+            self.child = grow(self.child, self.n, -1)
+            self.live = grow(self.live, self.n, False)
+            self.order = grow(self.order, self.n, -1)
+        return(k)
+
+    def add_solution(self, p):
+        i = self.n_sol
+        self.n_sol += 1
+        self.sol = grow(self.sol, self.n_sol, 0)
+        self.sol[i] = p
+        return(i)
+
+    def add(self, ll = None, ur = None, p = None, penalty = 0):
+        k = self.allocate(1)
+        self.ll[k] = ll
+        self.ur[k] = ur
+        if p is not None:
+            self.pid[k] = self.add_solution(p)
+        self.penalty[k] = penalty
+        self.update_score(k, 1)
+        return(k)
+
+    def update_score(self, k, m):
+        # the penalty is recorded but, as before, not applied to the score
+        volume = np.prod(self.ur[k:k + m] - self.ll[k:k + m], axis = 1)
+        self.score[k:k + m] = volume * np.where(self.pid[k:k + m] >= 0, 0.5, 1.0)
+
+    def get_state(self, n0 = 0, s0 = 0, dirty = ()):
+        # arrays of the rows n0.. and of the rows in dirty, which changed after an earlier state, and of the solutions s0..
+        rows = np.union1d(np.arange(n0, self.n), np.asarray(dirty, dtype = int))
+        d = {'n': self.n, 'rows': rows, 'n_sol': self.n_sol, 's0': s0, 'sol': self.sol[s0:self.n_sol]}
+        for c in STORE_COLUMNS:
+            d[c] = getattr(self, c)[rows]
+        return(d)
+
+    def set_state(self, d):
+        n = int(d['n'])
+        if n > self.n:
+            self.allocate(n - self.n)
+        rows = d['rows']
+        for c in STORE_COLUMNS:
+            getattr(self, c)[rows] = d[c]
+        self.n_sol = int(d['n_sol'])
+        self.sol = grow(self.sol, self.n_sol, 0)
+        self.sol[int(d['s0']):self.n_sol] = d['sol']
+
+    def contains(self, k, x):
+        return(bool(np.all(x >= self.ll[k]) and np.all(x < self.ur[k])))
+
+    def bisect(self, k, p = None):
+        ll = self.ll[k]
+        ur = self.ur[k]
+        l = ur - ll
+        q = self.sol[self.pid[k]] if self.pid[k] >= 0 else None
+        if q is not None and p is not None:
+            # non-empty region, point inserted: cut between the two points
+            m = 0.5 * (q + p)
+            assert(self.contains(k, m))
+            eta = (m - ll) / l
+            axis = np.argmin(np.abs(eta - 0.5))
+            value = ll[axis] + eta[axis] * l[axis]
+        else:
+            # cut the longest axis in halves
+            axis = np.argmax(l)
+            value = 0.5 * (ll[axis] + ur[axis])
+
+        # children in rows k1, k1 + 1, lower and upper half
+        k1 = self.allocate(2)
+        self.ll[k1:k1 + 2] = ll
+        self.ur[k1:k1 + 2] = ur
+        self.ur[k1, axis] = value
+        self.ll[k1 + 1, axis] = value
+        self.axis[k] = axis
+        self.split[k] = value
+        self.cut[k] = k1
+        if self.dirty is not None:
+            self.dirty.append(k)
+
+        # distribute points, penalized if no point is inserted
+        self.penalty[k1:k1 + 2] = self.penalty[k] + (1 if p is None else 0)
+        if q is not None:
+            assert(self.contains(k, q))
+            kq = k1 + int(q[axis] >= value)
+            self.pid[kq] = self.pid[k]
+        if p is not None:
+            assert(self.contains(k, p))
+            kp = k1 + int(p[axis] >= value)
+            # the cut between q and p separates them
+            assert(q is None or kp != kq), f'bisect of region {k} left points {q} and {p} in the same child'
+            self.pid[kp] = self.add_solution(p)
+        self.update_score(k1, 2)
+        return(k1, k1 + 1)
+
 class Region:
-    def __init__(self, ll = None, ur = None, p = None, penalty = 0):
-        assert(ll is not None)
-        assert(ur is not None)
-        self.ll = ll
-        self.ur = ur
-        assert(self.ll.shape[0] == self.ur.shape[0])
-        self.dim = self.ll.shape[0]
-        self.p = p
-        self.midpoint = 0.5 * (self.ll + self.ur)
-        self.l = self.ur - self.ll
-        self.closed_corner_polygon = np.array([ self.ll[0], self.ll[1], self.ur[0], self.ll[1], self.ur[0], self.ur[1], self.ll[0], self.ur[1], self.ll[0], self.ll[1] ]).reshape(5,2)
-        self.volume = np.prod(self.l)
-        self.penalty = 0
-
-        # score
-        self.score = self.volume * (0.4 ** self.penalty)
-        if self.p is not None: self.score *= 0.5
-
-    def __llur_contains(self, ll, ur, x):
-        c = True
-        for k in range(x.shape[0]):
-            if x[k] < ll[k]: c = False
-            if x[k] >= ur[k]: c = False
-        return(c)
+    # lightweight view of row k of a RegionStore
+    def __init__(self, ll = None, ur = None, p = None, penalty = 0, store = None, k = None):
+        if store is None:
+            assert(ll is not None)
+            assert(ur is not None)
+            ll = np.asarray(ll, dtype = float)
+            ur = np.asarray(ur, dtype = float)
+            assert(ll.shape[0] == ur.shape[0])
+            store = RegionStore(dim = ll.shape[0], capacity = 1)
+            k = store.add(ll = ll, ur = ur, p = p, penalty = penalty)
+        self.store = store
+        self.k = k
+
+    @property
+    def dim(self):
+        return(self.store.dim)
+
+    @property
+    def node(self):
+        return(self.k)
+
+    @property
+    def ll(self):
+        return(readonly(self.store.ll[self.k]))
+
+    @property
+    def ur(self):
+        return(readonly(self.store.ur[self.k]))
+
+    @property
+    def p(self):
+        if self.store.pid[self.k] < 0:
+            return(None)
+        return(readonly(self.store.sol[self.store.pid[self.k]]))
+
+    @property
+    def penalty(self):
+        return(int(self.store.penalty[self.k]))
+
+    @property
+    def score(self):
+        return(float(self.store.score[self.k]))
+
+    @property
+    def midpoint(self):
+        return(0.5 * (self.store.ll[self.k] + self.store.ur[self.k]))
+
+    @property
+    def l(self):
+        return(self.store.ur[self.k] - self.store.ll[self.k])
+
+    @property
+    def volume(self):
+        return(np.prod(self.l))
+
+    @property
+    def closed_corner_polygon(self):
+        ll = self.store.ll[self.k]
+        ur = self.store.ur[self.k]
+        return(np.array([ ll[0], ll[1], ur[0], ll[1], ur[0], ur[1], ll[0], ur[1], ll[0], ll[1] ]).reshape(5,2))
+
+    @property
+    def split_axis(self):
+        return(None if self.store.cut[self.k] < 0 else int(self.store.axis[self.k]))
+
+    @property
+    def split_value(self):
+        return(None if self.store.cut[self.k] < 0 else float(self.store.split[self.k]))
+
+    @property
+    def children(self):
+        k1 = self.store.cut[self.k]
+        if k1 < 0:
+            return(None)
+        return(Region(store = self.store, k = k1), Region(store = self.store, k = k1 + 1))
+
+    def __reduce__(self):
+        # pickled regions are detached copies of their row, not of the whole store
+        return(Region, (self.ll.copy(), self.ur.copy(), None if self.p is None else self.p.copy(), self.penalty))
+
+    def __deepcopy__(self, memo):
+        return(Region(store = copy(self.store, memo), k = self.k))
+
+    def __eq__(self, other):
+        if not isinstance(other, Region):
+            return(NotImplemented)
+        return(self.store is other.store and self.k == other.k)
+
+    def __hash__(self):
+        return(hash((id(self.store), self.k)))
 
     def contains(self, x):
-        return(self.__llur_contains(self.ll, self.ur, x))
-
-    def __split_parameters(self, x):
-        assert(self.contains(x))
-        d = np.inf
-        for k in range(self.dim):
-            eta = (x[k] - self.ll[k]) / self.l[k]
-            if np.abs(eta - 0.5) < d:
-                d = np.abs(eta - 0.5)
-                k_best = k
-                eta_best = eta
-        return(k_best, eta_best)
-
-    def __longest_axis(self):
-        return(np.argmax(self.l))
+        return(self.store.contains(self.k, x))
 
     def bisect(self, p = None):
-        if self.p is None and p is None:
-            # empty region, no point inserted: split equally into two, penalized
-            ll_1 = copy(self.ll)
-            ur_1 = copy(self.ur)
-            ll_2 = copy(self.ll)
-            ur_2 = copy(self.ur)
-            axis = self.__longest_axis()
-            mp = 0.5 * (self.ll[axis] + self.ur[axis])
-            ur_1[axis] = mp
-            ll_2[axis] = mp
-
-            # penalized
-            r1 = Region(ll = ll_1, ur = ur_1, p = None, penalty = self.penalty + 1)
-            r2 = Region(ll = ll_2, ur = ur_2, p = None, penalty = self.penalty + 1)
-            return(r1, r2)
-
-        if self.p is not None and p is None:
-            # non-empty region, no point inserted: split equally into two, penalized
-            ll_1 = copy(self.ll)
-            ur_1 = copy(self.ur)
-            ll_2 = copy(self.ll)
-            ur_2 = copy(self.ur)
-            axis = self.__longest_axis()
-            mp = 0.5 * (self.ll[axis] + self.ur[axis])
-            ur_1[axis] = mp
-            ll_2[axis] = mp
-
-            # check where point lies
-            c1 = self.__llur_contains(ll_1, ur_1, self.p)
-            c2 = self.__llur_contains(ll_2, ur_2, self.p)
-            assert(c1 ^ c2)
-
-            # penalized
-            p1 = self.p if c1 else None
-            p2 = self.p if c2 else None
-            r1 = Region(ll = ll_1, ur = ur_1, p = p1, penalty = self.penalty + 1)
-            r2 = Region(ll = ll_2, ur = ur_2, p = p2, penalty = self.penalty + 1)
-            return(r1, r2)
-
-        if self.p is None and p is not None:
-            # empty region, point inserted
-            ll_1 = copy(self.ll)
-            ur_1 = copy(self.ur)
-            ll_2 = copy(self.ll)
-            ur_2 = copy(self.ur)
-            axis = self.__longest_axis()
-            mp = 0.5 * (self.ll[axis] + self.ur[axis])
-            ur_1[axis] = mp
-            ll_2[axis] = mp
-
-            # check where point lies
-            c1 = self.__llur_contains(ll_1, ur_1, p)
-            c2 = self.__llur_contains(ll_2, ur_2, p)
-            assert(c1 ^ c2)
-
-            # not penalized
-            p1 = p if c1 else None
-            p2 = p if c2 else None
-            r1 = Region(ll = ll_1, ur = ur_1, p = p1, penalty = self.penalty)
-            r2 = Region(ll = ll_2, ur = ur_2, p = p2, penalty = self.penalty)
-            return(r1, r2)
-
-        if self.p is not None and p is not None:
-            # non-empty region, point inserted
-            ll_1 = copy(self.ll)
-            ur_1 = copy(self.ur)
-            ll_2 = copy(self.ll)
-            ur_2 = copy(self.ur)
-            axis, eta = self.__split_parameters(0.5 * (self.p + p))
-            ur_1[axis] = self.ll[axis] + eta * self.l[axis]
-            ll_2[axis] = ur_1[axis]
-
-            # check where points lies
-            self_c1 = self.__llur_contains(ll_1, ur_1, self.p)
-            self_c2 = self.__llur_contains(ll_2, ur_2, self.p)
-            assert(self_c1 ^ self_c2)
-            c1 = self.__llur_contains(ll_1, ur_1, p)
-            c2 = self.__llur_contains(ll_2, ur_2, p)
-            assert(c1 ^ c2)
-            if self_c1 == c1 or self_c2 == c2:
-                print('ll', self.ll)
-                print('ur', self.ur)
-                print('ll_1', ll_1)
-                print('ur_1', ur_1)
-                print('ll_2', ll_2)
-                print('ur_2', ur_2)
-                print('self.p', self.p)
-                print('p', p)
-                exit()
-
-            # not penalized
-            p1 = p if c1 else self.p
-            p2 = p if c2 else self.p
-            r1 = Region(ll = ll_1, ur = ur_1, p = p1, penalty = self.penalty)
-            r2 = Region(ll = ll_2, ur = ur_2, p = p2, penalty = self.penalty)
-            return(r1, r2)
+        k1, k2 = self.store.bisect(self.k, p = p)
+        return(Region(store = self.store, k = k1), Region(store = self.store, k = k2))
 
     def __str__(self):
         s = '# region\n'
@@ -157,7 +261,90 @@ class Region:
         s += f'penalty: {self.penalty}\n'
         s += f'score: {self.score}\n'
         return(s)
-    
+
+class RegionView:
+    # read-only access to a region of a live domain, without bisect
+    def __init__(self, region = None):
+        assert(region is not None)
+        self.__region = region
+
+    @property
+    def dim(self):
+        return(self.__region.dim)
+
+    @property
+    def node(self):
+        return(self.__region.node)
+
+    @property
+    def ll(self):
+        return(self.__region.ll)
+
+    @property
+    def ur(self):
+        return(self.__region.ur)
+
+    @property
+    def p(self):
+        return(self.__region.p)
+
+    @property
+    def penalty(self):
+        return(self.__region.penalty)
+
+    @property
+    def score(self):
+        return(self.__region.score)
+
+    @property
+    def midpoint(self):
+        return(self.__region.midpoint)
+
+    @property
+    def l(self):
+        return(self.__region.l)
+
+    @property
+    def volume(self):
+        return(self.__region.volume)
+
+    @property
+    def closed_corner_polygon(self):
+        return(self.__region.closed_corner_polygon)
+
+    @property
+    def split_axis(self):
+        return(self.__region.split_axis)
+
+    @property
+    def split_value(self):
+        return(self.__region.split_value)
+
+    @property
+    def children(self):
+        children = self.__region.children
+        if children is None:
+            return(None)
+        return(RegionView(region = children[0]), RegionView(region = children[1]))
+
+    def __reduce__(self):
+        # pickled as a view of the detached copy of the region
+        return(RegionView, (self.__region,))
+
+    def __eq__(self, other):
+        if isinstance(other, RegionView):
+            other = other.__region
+        return(self.__region == other)
+
+    def __hash__(self):
+        return(hash(self.__region))
+
+    def contains(self, x):
+        return(self.__region.contains(x))
+
+    def __str__(self):
+        return(str(self.__region))
+
 class Domain:
     def __init__(self, ll = None, ur = None):
         assert(ll is not None)
@@ -166,36 +353,130 @@ class Domain:
         self.ur = np.array(ur).astype(float)
         assert(self.ll.shape[0] == self.ur.shape[0])
         self.dim = self.ll.shape[0]
-        self.regions = [Region(ll = self.ll, ur = self.ur)]
+        self.store = RegionStore(dim = self.dim)
+        root = self.store.add(ll = self.ll, ur = self.ur)
+
+        # live leaves and a lazy-deletion max-heap on score, ties go to the earliest inserted region
+        self.n_regions = 0
+        self.heap = []
+        self.n_inserted = 0
+        self.__insert(root)
+
+    def __insert(self, k):
+        self.store.live[k] = True
+        self.store.order[k] = self.n_inserted
+        self.n_regions += 1
+        heapq.heappush(self.heap, (-self.store.score[k], self.n_inserted, k))
+        self.n_inserted += 1
+
+    def get_state(self, n0 = 0, s0 = 0, dirty = ()):
+        d = self.store.get_state(n0 = n0, s0 = s0, dirty = dirty)
+        d['domain_ll'] = self.ll
+        d['domain_ur'] = self.ur
+        d['n_inserted'] = self.n_inserted
+        return(d)
+
+    def set_state(self, d):
+        assert(np.array_equal(d['domain_ll'], self.ll) and np.array_equal(d['domain_ur'], self.ur))
+        self.store.set_state(d)
+        self.n_inserted = int(d['n_inserted'])
+
+        # leaves and heap from the live rows
+        ks = self.leaves()
+        self.n_regions = ks.shape[0]
+        self.heap = [(-self.store.score[k], self.store.order[k], k) for k in ks]
+        heapq.heapify(self.heap)
+
+    def save(self, path):
+        np.savez(path, **self.get_state())
+
+    @staticmethod
+    def load(path):
+        d = np.load(path)
+        domain = Domain(ll = d['domain_ll'], ur = d['domain_ur'])
+        domain.set_state(d)
+        return(domain)
+
+    @property
+    def regions(self):
+        return([Region(store = self.store, k = k) for k in self.leaves()])
+
+    def leaves(self):
+        return(np.flatnonzero(self.store.live[:self.store.n]))
+
+    def region(self, k):
+        return(Region(store = self.store, k = k))
 
     def get_top_region(self):
-        assert(len(self.regions) > 0)
-        score_max = -np.inf
-        for region in self.regions:
-            if region.score > score_max:
-                score_max = region.score
-                region_max = region
-        return(region_max)
+        assert(self.n_regions > 0)
+        while not self.store.live[self.heap[0][2]]:
+            heapq.heappop(self.heap)
+        return(self.region(self.heap[0][2]))
+
+    def get_top_regions(self, n):
+        # the n best regions, best first
+        top = []
+        while len(top) < n and len(self.heap) > 0:
+            e = heapq.heappop(self.heap)
+            if self.store.live[e[2]]:
+                top += [e]
+        for e in top:
+            heapq.heappush(self.heap, e)
+        return([self.region(e[2]) for e in top])
+
+    def is_live(self, region):
+        # regions and region views of this domain
+        return(region == Region(store = self.store, k = region.node) and bool(self.store.live[region.node]))
 
     def get_region_with_point(self, x):
-        region = None
-        for r in self.regions:
-            if r.contains(x):
-                assert(region is None)
-                region = r 
-        return(region)
+        if np.any(x < self.ll) or np.any(x >= self.ur):
+            return(None)
+        child = self.store.child
+        node = 0
+        while child[node] >= 0:
+            node = child[node] + int(x[self.store.axis[node]] >= self.store.split[node])
+        return(self.region(node))
+
+    def locate(self, x):
+        # region ids (tree nodes) of all rows of x, -1 outside the domain
+        x = np.atleast_2d(x)
+        child = self.store.child
+        node = np.zeros(x.shape[0], dtype = int)
+        inside = np.all((x >= self.ll) & (x < self.ur), axis = 1)
+        node[~inside] = -1
+        active = np.flatnonzero(inside)
+        active = active[child[node[active]] >= 0]
+        while active.shape[0] > 0:
+            nd = node[active]
+            right = x[active, self.store.axis[nd]] >= self.store.split[nd]
+            node[active] = child[nd] + right
+            active = active[child[node[active]] >= 0]
+        return(node)
 
     def replace(self, regions_in = None, regions_out = None):
+        ks_in = [r.k for r in regions_in]
+        assert(len(ks_in) == 2 * len(regions_out))
+
+        # link the bisections into the tree
         for r in regions_out:
-            self.regions.remove(r)
-        self.regions += regions_in
+            assert(r.store is self.store)
+            assert(self.store.live[r.k])
+            k1 = self.store.cut[r.k]
+            assert(k1 in ks_in and k1 + 1 in ks_in)
+            self.store.child[r.k] = k1
+            self.store.live[r.k] = False
+            self.n_regions -= 1
+        for k in ks_in:
+            self.__insert(k)
+
+        # drop dead heap entries once they dominate
+        if len(self.heap) > 2 * self.n_regions + 64:
+            self.heap = [e for e in self.heap if self.store.live[e[2]]]
+            heapq.heapify(self.heap)
 
     def solutions(self):
-        s = []
-        for r in self.regions:
-            if r.p is not None:
-                s += [r.p]
-        return(np.vstack(s))
+        # all points inserted by bisections, in order of insertion, as a read-only view
+        return(readonly(self.store.sol[:self.store.n_sol]))
 
     def plot(self, x = None):
         if x is not None:
@@ -214,7 +495,63 @@ class Domain:
         s += f'dim: {self.dim}\n'
         s += f'll: {self.ll}\n'
         s += f'ur: {self.ur}\n'
-        s += f'regions: {len(self.regions)}\n'
+        s += f'regions: {self.n_regions}\n'
         return(s)
-    
+
+class DomainView:
+    # read-only access to a live domain
+    def __init__(self, domain = None):
+        assert(domain is not None)
+        self.__domain = domain
+
+    @property
+    def dim(self):
+        return(self.__domain.dim)
+
+    @property
+    def ll(self):
+        return(readonly(self.__domain.ll.view()))
+
+    @property
+    def ur(self):
+        return(readonly(self.__domain.ur.view()))
+
+    @property
+    def n_regions(self):
+        return(self.__domain.n_regions)
+
+    @property
+    def regions(self):
+        return([RegionView(region = r) for r in self.__domain.regions])
+
+    def leaves(self):
+        return(self.__domain.leaves())
+
+    def region(self, k):
+        return(RegionView(region = self.__domain.region(k)))
+
+    def get_top_region(self):
+        return(RegionView(region = self.__domain.get_top_region()))
+
+    def get_top_regions(self, n):
+        return([RegionView(region = r) for r in self.__domain.get_top_regions(n)])
+
+    def is_live(self, region):
+        return(self.__domain.is_live(region))
+
+    def get_region_with_point(self, x):
+        region = self.__domain.get_region_with_point(x)
+        return(None if region is None else RegionView(region = region))
+
+    def locate(self, x):
+        return(self.__domain.locate(x))
+
+    def solutions(self):
+        return(self.__domain.solutions())
+
+    def plot(self, x = None):
+        self.__domain.plot(x = x)
+
+    def __str__(self):
+        return(str(self.__domain))
 
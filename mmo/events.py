@@ -0,0 +1,94 @@
+# libs
+import numpy as np
+import json
+from collections import namedtuple
+
+# kinds of events emitted by MultiModalMinimizer
+# ls_start: region, ll, ur          local search started in region
+# ls_end: region, x, y, n_fct_eval, aborted, exhausted
+# bisect: region, axis, split, children, point
+# solution: region, x, y            new solution stored in region
+# budget: used, budget              evaluations used after an iteration
+KINDS = ('ls_start', 'ls_end', 'bisect', 'solution', 'budget')
+
+# fcts
+def plain(v):
+    # json-able value
+    if isinstance(v, np.ndarray):
+        return(v.tolist())
+    if isinstance(v, np.generic):
+        return(v.item())
+    if isinstance(v, (tuple, list)):
+        return([plain(u) for u in v])
+    if isinstance(v, float) and not np.isfinite(v):
+        return(str(v))
+    return(v)
+
+# classes
+class Event(namedtuple('Event', ['kind', 'iter', 'n_fct_calls', 'data'])):
+    __slots__ = ()
+
+    def to_dict(self):
+        d = {'kind': self.kind, 'iter': self.iter, 'n_fct_calls': self.n_fct_calls}
+        for key, v in self.data.items():
+            d[key] = plain(v)
+        return(d)
+
+    def __str__(self):
+        return(json.dumps(self.to_dict()))
+
+class EventLog:
+    # callback keeping the events in memory, optionally only some kinds
+    def __init__(self, kinds = None):
+        assert(kinds is None or all(kind in KINDS for kind in kinds))
+        self.kinds = kinds
+        self.events = []
+
+    def __call__(self, event):
+        if self.kinds is None or event.kind in self.kinds:
+            self.events.append(event)
+
+    def __iter__(self):
+        return(iter(self.events))
+
+    def __len__(self):
+        return(len(self.events))
+
+class JsonlSink:
+    # callback appending the events as json lines to path, written in blocks of buffer lines
+    def __init__(self, path = None, buffer = 10000, kinds = None):
+        assert(path is not None)
+        assert(buffer > 0)
+        assert(kinds is None or all(kind in KINDS for kind in kinds))
+        self.path = path
+        self.buffer = buffer
+        self.kinds = kinds
+        self.lines = []
+        self.n_written = 0
+        self.fh = open(path, 'a')
+
+    def __call__(self, event):
+        if self.kinds is None or event.kind in self.kinds:
+            self.lines.append(json.dumps(event.to_dict()))
+            if len(self.lines) >= self.buffer:
+                self.flush()
+
+    def flush(self):
+        if len(self.lines) > 0:
+            self.fh.write('\n'.join(self.lines) + '\n')
+            self.fh.flush()
+            self.n_written += len(self.lines)
+            self.lines = []
+
+    def close(self):
+        if self.fh is not None:
+            self.flush()
+            self.fh.close()
+            self.fh = None
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
+
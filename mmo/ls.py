@@ -2,36 +2,104 @@ import numpy as np
 import numpy.linalg as la
 from cmaes import CMA
 from mmo.domain import Region
+from modules.timing import NO_TIMING
 import random
 
+# fcts
+def popsize(dim):
+    # default CMA-ES population size
+    return(4 + int(np.floor(3 * np.log(dim))))
+
+def scaled_cap(region = None, domain = None, factor = 1000):
+    # evaluation cap of a local search: factor * dim on the whole domain, scaled with the
+    # geometric mean relative edge length of the region, at least two generations
+    rel = np.exp(np.mean(np.log(region.l / (domain.ur - domain.ll))))
+    return(max(2 * popsize(region.dim), int(factor * region.dim * rel)))
+
 # cma
 class Cma:
-    def __init__(self, f = None, region = None, max_gen = 10**20):
+    # vectorized: f maps a (popsize, dim) generation to popsize values in one call
+    # reserve: reserve(m) grants up to m further evaluations, the search stops when fewer are granted
+    # executor: object with a map method (thread/process pool) or a map function, evaluates a generation in parallel
+    # budget, max_fct_eval: hard limits on the evaluations of this search, it stops mid-generation and keeps the best point so far
+    # abort: abort(mean, spread, spread0) is checked after every generation, the search stops early when it returns True
+    # seed: seed of the CMA-ES sampler, None for a random one
+    # timing: modules.timing.Timing, times ask and tell (the sampler's own work) in scopes of these names
+    def __init__(self, f = None, region = None, max_gen = 10**20, vectorized = False, reserve = None, executor = None, budget = np.inf, max_fct_eval = np.inf, abort = None, seed = None, timing = None):
         assert(region is not None)
+        timing = NO_TIMING if timing is None else timing
+        limit = min(budget, max_fct_eval)
+        if executor is not None:
+            assert(not vectorized)
+            pmap = executor.map if hasattr(executor, 'map') else executor
+            f_single = f
+            f = lambda X: np.array(list(pmap(f_single, X)), dtype = float).reshape(-1)
+            vectorized = True
         x0 = region.midpoint
         C = 0.5 * np.diag(region.l) / 3
-        optimizer = CMA(mean = x0, sigma = 1.0, cov = C)
+        optimizer = CMA(mean = x0, sigma = 1.0, cov = C, seed = seed)
+        spread0 = np.sqrt(np.trace(C) / C.shape[0])
+        x_best = None
         y_best = np.inf
         n_fct_eval = 0
+        exhausted = False
+        aborted = False
         for gen in range(max_gen):
-            solutions = []
-            for _ in range(optimizer.population_size):
-                x = optimizer.ask()
-                y = f(x)
-                n_fct_eval += 1
-                solutions.append((x, y))
-                if y < y_best:
-                    x_best = x
-                    y_best = y
-            optimizer.tell(solutions)
+            if vectorized:
+                with timing.scope('ask'):
+                    X = np.array([optimizer.ask() for _ in range(optimizer.population_size)])
+                m = self.__grant(X.shape[0], limit - n_fct_eval, reserve)
+                exhausted = m < X.shape[0]
+                X = X[:m]
+                if X.shape[0] > 0:
+                    Y = np.asarray(f(X), dtype = float).reshape(-1)
+                    assert(Y.shape[0] == X.shape[0])
+                    n_fct_eval += X.shape[0]
+                    # NaN never beats the best, as in the scalar comparison below
+                    k = np.argmin(np.where(np.isnan(Y), np.inf, Y))
+                    if Y[k] < y_best:
+                        x_best = X[k]
+                        y_best = Y[k]
+                    solutions = list(zip(X, Y))
+            else:
+                solutions = []
+                for _ in range(optimizer.population_size):
+                    if self.__grant(1, limit - n_fct_eval, reserve) < 1:
+                        exhausted = True
+                        break
+                    with timing.scope('ask'):
+                        x = optimizer.ask()
+                    y = f(x)
+                    n_fct_eval += 1
+                    solutions.append((x, y))
+                    if y < y_best:
+                        x_best = x
+                        y_best = y
+            if exhausted:
+                break
+            with timing.scope('tell'):
+                optimizer.tell(solutions)
             if optimizer.should_stop():
                 break
+            if abort is not None:
+                spread = optimizer._sigma * np.sqrt(np.trace(optimizer._C) / optimizer.dim)
+                if abort(optimizer.mean, spread, spread0):
+                    aborted = True
+                    break
 
         self.n_fct_eval = n_fct_eval
+        self.exhausted = exhausted
+        self.aborted = aborted
         self.x = x_best
         self.y = y_best
         self.n_gen = gen
 
+    def __grant(self, m, left, reserve):
+        m = int(min(m, max(0, left)))
+        if reserve is not None and m > 0:
+            m = reserve(m)
+        return(m)
+
     def __str__(self):
         s = '## cmaes\n'
         s += f'x = {self.x}\n'
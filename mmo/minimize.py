@@ -4,17 +4,67 @@
 import numpy as np
 import numpy.linalg as la
 from copy import deepcopy as copy
+from collections import namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
+import multiprocessing as mp
+import threading
+import json
 import mmo
+import mmo.parallel
+from mmo.basin import KnownPoints
+from mmo.domain import DomainView, RegionView
+from mmo.events import Event
+from modules.timing import NO_TIMING
+
+###############################################################################
+# state
+###############################################################################
+STATE_COUNTERS = ['iter', 'n_fct_calls', 'n_local_solves', 'n_basin_aborts', 'n_fct_aborted', 'n_fct_saved', 'n_complete_solves', 'n_fct_complete']
 
 ###############################################################################
 # classes
 ###############################################################################
+class Iteration(namedtuple('Iteration', ['iter', 'n_local_solves', 'n_fct_calls', 'region', 'x', 'y', 'domain'])):
+    # immutable record of one iteration, region and domain are read-only views of the live domain
+    # with n_parallel > 1, region is a tuple and x, y are stacked over the parallel local solves
+    __slots__ = ()
+
+    def __str__(self):
+        s = '## MultiModalMinimizer\n'
+        s += f'iteration: {self.iter}\n'
+        s += f'n_local_solves: {self.n_local_solves}\n'
+        s += f'n_fct_calls: {self.n_fct_calls}\n'
+        return(s)
+
 class MultiModalMinimizer:
-    def __init__(self, f = None, domain = None, verbose = 0, budget = np.inf, max_iter = 10**20):
+    def __init__(self, f = None, domain = None, verbose = 0, budget = np.inf, max_iter = 10**20, full_copy = False, vectorized = False, n_parallel = 1, executor = None, cache = None, ls_budget = None, basin_abort = False, seed = None, checkpoint = None, events = None, timing = None):
         assert(f is not None)
         assert(domain is not None)
         self.f = f
         self.domain = domain
+        self.domain_view = DomainView(domain = domain)
+        self.full_copy = full_copy
+        self.vectorized = vectorized
+        self.n_parallel = n_parallel
+        self.executor = executor
+        assert(executor is None or (not vectorized and n_parallel == 1))
+        self.cache = cache
+        self.ls_budget = ls_budget
+
+        # basin revisit detection: True or a KnownPoints with custom radius/shrink
+        self.known = None
+        if basin_abort is True:
+            self.known = KnownPoints(dim = domain.dim, points = domain.solutions())
+        elif basin_abort:
+            self.known = basin_abort
+        self.n_basin_aborts = 0
+        self.n_fct_aborted = 0
+        self.n_fct_saved = 0
+        self.n_complete_solves = 0
+        self.n_fct_complete = 0
+        self.pool = None
+        self.pool_counter = None
+        self.lock = threading.Lock()
         self.dim = domain.dim
         self.budget = budget
         self.max_iter = max_iter
@@ -24,12 +74,183 @@ class MultiModalMinimizer:
         self.n_fct_calls = 0
         self.n_local_solves = 0
 
+        # seeds of the local searches, and checkpoints for resuming long runs
+        self.rng = np.random.default_rng(seed)
+        self.iter = 0
+        self.iter_start = 0
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            checkpoint.attach(self)
+
+        # profiling scopes, see modules.timing: iteration, cma (ask, tell, objective), objective, region_lookup,
+        # top_region, snapshot; with n_parallel > 1 and run_async, local_solve (ask, tell, objective) timed in
+        # the worker processes and merged; disabled by default
+        self.timing = NO_TIMING if timing is None else timing
+
+        if n_parallel > 1:
+            self.check_workers('n_parallel > 1')
+
+        # event callbacks, see mmo.events
+        self.listeners = []
+        if events is not None:
+            for fct in (events if isinstance(events, (list, tuple)) else [events]):
+                self.add_listener(fct)
+
+    def add_listener(self, fct):
+        self.listeners.append(fct)
+
+    def emit(self, kind, **data):
+        if len(self.listeners) > 0:
+            event = Event(kind, self.iter, self.n_fct_calls, data)
+            for fct in self.listeners:
+                fct(event)
+
     def fct(self, x):
+        if self.cache is not None:
+            y = self.cache.get(x)
+            if y is not None:
+                return(y)
         self.n_fct_calls += 1
-        return(self.f(x))
+        with self.timing.scope('objective'):
+            y = self.f(x)
+        if self.cache is not None:
+            self.cache.put(x, y)
+        return(y)
+
+    def fct_batch(self, x):
+        # objective on the rows of x, vectorized or mapped by the executor, cache hits are not counted
+        if self.cache is None:
+            self.n_fct_calls += x.shape[0]
+            return(self.__eval_batch(x))
+        y = np.zeros(x.shape[0])
+        miss = []
+        for k in range(x.shape[0]):
+            yk = self.cache.get(x[k])
+            if yk is None:
+                miss += [k]
+            else:
+                y[k] = yk
+        if len(miss) > 0:
+            self.n_fct_calls += len(miss)
+            y[miss] = self.__eval_batch(x[miss])
+            for k in miss:
+                self.cache.put(x[k], y[k])
+        return(y)
+
+    def __eval_batch(self, x):
+        with self.timing.scope('objective'):
+            if self.executor is None:
+                return(self.f(x))
+            pmap = self.executor.map if hasattr(self.executor, 'map') else self.executor
+            return(np.array(list(pmap(self.f, x)), dtype = float).reshape(-1))
+
+    def copy(self):
+        return(copy(self))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['pool_counter'] = None
+        state['executor'] = None
+        del state['lock']
+        state['listeners'] = []
+        state['timing'] = NO_TIMING
+        return(state)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.pool_counter = None
+        self.lock = threading.Lock()
+
+    def check_workers(self, mode):
+        # options that work on the objective or domain in this process only, not in the worker processes
+        serial_only = [name for name, on in [('cache', self.cache is not None), ('executor', self.executor is not None), ('basin_abort', self.known is not None)] if on]
+        if len(serial_only) > 0:
+            raise ValueError(f'{mode} runs the local searches in worker processes and cannot be combined with {", ".join(serial_only)}')
+
+    def ls_seed(self):
+        return(int(self.rng.integers(2**31 - 1)))
+
+    def get_state(self, n0 = 0, s0 = 0, dirty = ()):
+        # domain rows n0.. and dirty, solutions s0.., counters and the seed generator
+        d = self.domain.get_state(n0 = n0, s0 = s0, dirty = dirty)
+        for c in STATE_COUNTERS:
+            d[c] = getattr(self, c)
+        d['rng_state'] = json.dumps(self.rng.bit_generator.state)
+        return(d)
+
+    def set_state(self, d):
+        self.domain.set_state(d)
+        for c in STATE_COUNTERS:
+            setattr(self, c, d[c].item())
+        self.rng.bit_generator.state = json.loads(str(d['rng_state']))
+        self.iter_start = self.iter
+        if self.known is not None:
+            self.known = KnownPoints(dim = self.dim, points = self.domain.solutions(), radius = self.known.radius, shrink = self.known.shrink)
+
+    def save(self, path):
+        np.savez(path, **self.get_state())
+
+    def load(self, path):
+        # restore a saved run into a minimizer created with the same f, domain bounds and options
+        self.set_state(np.load(path))
+
+    def ls_cap(self, region):
+        # evaluation cap of a local search in region: none, from ls_budget(region), or scaled with region and dim
+        if self.ls_budget is None:
+            return(np.inf)
+        if callable(self.ls_budget):
+            return(self.ls_budget(region))
+        return(mmo.ls.scaled_cap(region = region, domain = self.domain, factor = self.ls_budget))
+
+    def bisect(self, region, p = None):
+        r1, r2 = region.bisect(p = p)
+        self.emit('bisect', region = region.node, axis = region.split_axis, split = region.split_value, children = (r1.node, r2.node), point = p is not None)
+        return(r1, r2)
+
+    def insert(self, rs, x, y = None):
+        # fold the local solution x (value y) of a search started in rs into the domain
+        with self.timing.scope('region_lookup'):
+            rr = self.domain.get_region_with_point(x)
+        rs_live = self.domain.is_live(rs)
+        if rr is not None and rr.p is not None and np.array_equal(rr.p, x):
+            # solution already known
+            rr = None
+
+        if rr is None:
+            # solution outside the domain or known
+            if rs_live:
+                r1, r2 = self.bisect(rs, p = None)
+                self.domain.replace(regions_in = [r1, r2], regions_out = [rs])
+
+        elif rs == rr:
+            # solution found in r0
+            r1, r2 = self.bisect(rs, p = x)
+            self.domain.replace(regions_in = [r1, r2], regions_out = [rs])
+
+        elif not rs_live:
+            # r0 already split by an earlier parallel result
+            r3, r4 = self.bisect(rr, p = x)
+            self.domain.replace(regions_in = [r3, r4], regions_out = [rr])
+
+        else:
+            r1, r2 = self.bisect(rs, p = None)
+            r3, r4 = self.bisect(rr, p = x)
+            self.domain.replace(regions_in = [r1, r2, r3, r4], regions_out = [rs, rr])
+
+        if rr is not None:
+            self.emit('solution', region = rr.node, x = x, y = y)
+            if self.known is not None:
+                self.known.add(x)
 
     def __iter__(self):
-        self.iter = 0
+        self.iter = self.iter_start
         return(self)
 
     def __str__(self):
@@ -39,36 +260,154 @@ class MultiModalMinimizer:
             s += f'iteration: {self.iter - 1}\n'
             s += f'n_local_solves: {self.n_local_solves}\n'
             s += f'n_fct_calls: {self.n_fct_calls}\n'
+            if self.known is not None:
+                s += f'n_basin_aborts: {self.n_basin_aborts}\n'
+                s += f'n_fct_aborted: {self.n_fct_aborted}\n'
+                s += f'n_fct_saved (estimate): {int(self.n_fct_saved)}\n'
         return(s)
 
     def __next__(self):
+        with self.timing.scope('iteration'):
+            if self.n_parallel > 1:
+                return(self.__next_parallel())
+            return(self.__next_serial())
+
+    def __next_serial(self):
         # search in region
-        rs = self.domain.get_top_region()
-        cma = mmo.Cma(f = self.fct, region = rs)
+        with self.timing.scope('top_region'):
+            rs = self.domain.get_top_region()
+        budget = self.budget - self.n_fct_calls
+        abort = None if self.known is None else self.known.heading_to_known
+        self.emit('ls_start', region = rs.node, ll = rs.ll, ur = rs.ur)
+        with self.timing.scope('cma'):
+            if self.vectorized or self.executor is not None:
+                cma = mmo.Cma(f = self.fct_batch, region = rs, vectorized = True, budget = budget, max_fct_eval = self.ls_cap(rs), abort = abort, seed = self.ls_seed(), timing = self.timing)
+            else:
+                cma = mmo.Cma(f = self.fct, region = rs, budget = budget, max_fct_eval = self.ls_cap(rs), abort = abort, seed = self.ls_seed(), timing = self.timing)
         self.n_local_solves += 1
-        rr = self.domain.get_region_with_point(cma.x)
-
-        if rs == rr:
-            # solution found in r0
-            r1, r2 = rs.bisect(p = cma.x)
+        self.emit('ls_end', region = rs.node, x = cma.x, y = cma.y, n_fct_eval = cma.n_fct_eval, aborted = cma.aborted, exhausted = cma.exhausted)
+        if cma.aborted:
+            # heading to a known solution: penalize r0, saved evaluations estimated from the completed searches
+            self.n_basin_aborts += 1
+            self.n_fct_aborted += cma.n_fct_eval
+            if self.n_complete_solves > 0:
+                self.n_fct_saved += max(0, self.n_fct_complete / self.n_complete_solves - cma.n_fct_eval)
+            r1, r2 = self.bisect(rs, p = None)
             self.domain.replace(regions_in = [r1, r2], regions_out = [rs])
-
-        else:
-            r1, r2 = rs.bisect(p = None)
-            r3, r4 = rr.bisect(p = cma.x)
-            self.domain.replace(regions_in = [r1, r2, r3, r4], regions_out = [rs, rr])
+        elif cma.x is not None:
+            if not cma.exhausted:
+                self.n_complete_solves += 1
+                self.n_fct_complete += cma.n_fct_eval
+            self.insert(rs, cma.x, cma.y)
 
         # stop
+        self.emit('budget', used = self.n_fct_calls, budget = self.budget)
         if self.n_fct_calls >= self.budget or self.iter >= self.max_iter:
+            if self.checkpoint is not None:
+                self.checkpoint(self, force = True)
             raise StopIteration
 
         # admin
         self.iter += 1
-        return(copy(self))
+        if self.checkpoint is not None:
+            self.checkpoint(self)
+        with self.timing.scope('snapshot'):
+            if self.full_copy:
+                return(self.copy())
+            return(Iteration(self.iter - 1, self.n_local_solves, self.n_fct_calls, RegionView(region = rs), cma.x, cma.y, self.domain_view))
 
+    def __next_parallel(self):
+        # local searches on the n_parallel best regions, folded in in order of score
+        if self.pool is None:
+            self.pool_counter = mp.Value('q', 0)
+            self.pool = mmo.parallel.process_pool(f = self.f, n_workers = self.n_parallel, vectorized = self.vectorized, counter = self.pool_counter, budget = self.budget, timing = self.timing)
+        self.pool_counter.value = int(self.n_fct_calls)
+        with self.timing.scope('top_region'):
+            rss = self.domain.get_top_regions(self.n_parallel)
+        for rs in rss:
+            self.emit('ls_start', region = rs.node, ll = rs.ll, ur = rs.ur)
+        results = list(self.pool.map(mmo.parallel.local_solve, rss, [self.ls_cap(rs) for rs in rss], [self.ls_seed() for rs in rss]))
+        for rs, (x, y, n_fct_eval, timing) in zip(rss, results):
+            if timing is not None:
+                self.timing.merge(timing)
+            self.n_fct_calls += n_fct_eval
+            self.n_local_solves += 1
+            self.emit('ls_end', region = rs.node, x = x, y = y, n_fct_eval = n_fct_eval)
+            if x is not None:
+                self.insert(rs, x, y)
 
+        # stop
+        self.emit('budget', used = self.n_fct_calls, budget = self.budget)
+        if self.n_fct_calls >= self.budget or self.iter >= self.max_iter:
+            self.close()
+            if self.checkpoint is not None:
+                self.checkpoint(self, force = True)
+            raise StopIteration
 
+        # admin
+        self.iter += 1
+        if self.checkpoint is not None:
+            self.checkpoint(self)
+        with self.timing.scope('snapshot'):
+            if self.full_copy:
+                return(self.copy())
+            x = np.array([r[0] for r in results])
+            y = np.array([r[1] for r in results])
+            return(Iteration(self.iter - 1, self.n_local_solves, self.n_fct_calls, tuple(RegionView(region = rs) for rs in rss), x, y, self.domain_view))
 
+    def run_async(self, n_workers = 2):
+        # checked on the call, the generator body only runs on the first next()
+        self.check_workers('run_async')
+        return(self.__run_async(n_workers))
 
+    def __run_async(self, n_workers):
+        # steady state: n_workers local searches in flight, each result is folded into the domain
+        # on arrival and a new search is started on the best free region; the workers draw their
+        # evaluations from one shared counter, so the budget holds across all searches in flight;
+        # at most max_iter searches, one iteration each, as in the serial driver
+        counter = mp.Value('q', int(self.n_fct_calls))
+        pool = mmo.parallel.process_pool(f = self.f, n_workers = n_workers, vectorized = self.vectorized, counter = counter, budget = self.budget, timing = self.timing)
+        in_flight = {}
+        self.iter = self.iter_start
+        try:
+            while True:
+                # dispatch
+                while len(in_flight) < n_workers and counter.value < self.budget and self.iter + len(in_flight) < self.max_iter:
+                    with self.lock, self.timing.scope('top_region'):
+                        busy = list(in_flight.values())
+                        rss = [r for r in self.domain.get_top_regions(len(busy) + 1) if r not in busy]
+                    if len(rss) == 0:
+                        break
+                    in_flight[pool.submit(mmo.parallel.local_solve, rss[0], self.ls_cap(rss[0]), self.ls_seed())] = rss[0]
+                    self.emit('ls_start', region = rss[0].node, ll = rss[0].ll, ur = rss[0].ur)
+                if len(in_flight) == 0:
+                    break
 
+                # fold in finished searches
+                done, _ = wait(in_flight, return_when = FIRST_COMPLETED)
+                for future in done:
+                    rs = in_flight.pop(future)
+                    x, y, n_fct_eval, timing = future.result()
+                    if timing is not None:
+                        self.timing.merge(timing)
+                    with self.lock:
+                        self.n_fct_calls += n_fct_eval
+                        self.n_local_solves += 1
+                        self.emit('ls_end', region = rs.node, x = x, y = y, n_fct_eval = n_fct_eval)
+                        if x is not None:
+                            self.insert(rs, x, y)
+                        self.emit('budget', used = self.n_fct_calls, budget = self.budget)
+                        self.iter += 1
+                        if self.checkpoint is not None:
+                            self.checkpoint(self)
+                        with self.timing.scope('snapshot'):
+                            if self.full_copy:
+                                m = self.copy()
+                            else:
+                                m = Iteration(self.iter - 1, self.n_local_solves, self.n_fct_calls, RegionView(region = rs), x, y, self.domain_view)
+                    yield(m)
+        finally:
+            pool.shutdown(cancel_futures = True)
+            if self.checkpoint is not None:
+                self.checkpoint(self, force = True)
 
@@ -0,0 +1,63 @@
+# libs
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from mmo.ls import Cma
+from modules.timing import Timing, NO_TIMING
+
+# worker state, installed once per worker process
+worker_f = None
+worker_vectorized = False
+worker_counter = None
+worker_budget = np.inf
+worker_timing = NO_TIMING
+
+# fcts
+def init_worker(f, vectorized, counter, budget, timing):
+    global worker_f, worker_vectorized, worker_counter, worker_budget, worker_timing
+    worker_f = f
+    worker_vectorized = vectorized
+    worker_counter = counter
+    worker_budget = budget
+    worker_timing = NO_TIMING if not timing.enabled else Timing(trace = timing.trace)
+
+def reserve(m):
+    # grant up to m evaluations from the budget shared by all workers
+    with worker_counter.get_lock():
+        granted = int(min(m, max(0, worker_budget - worker_counter.value)))
+        worker_counter.value += granted
+    return(granted)
+
+def local_solve(region, max_fct_eval = np.inf, seed = None):
+    # returns the timing of this search too, to be merged into the caller's timing (None when disabled)
+    worker_timing.reset()
+    with worker_timing.scope('local_solve'):
+        f = worker_timing.timed('objective')(worker_f)
+        cma = Cma(f = f, region = region, vectorized = worker_vectorized, reserve = None if worker_counter is None else reserve, max_fct_eval = max_fct_eval, seed = seed, timing = worker_timing)
+    return(cma.x, cma.y, cma.n_fct_eval, worker_timing.get_state() if worker_timing.enabled else None)
+
+def evaluate(x):
+    return(worker_f(x))
+
+def process_pool(f = None, n_workers = None, vectorized = False, counter = None, budget = np.inf, timing = NO_TIMING):
+    # forked workers inherit f (and the shared counter), so closures and lambdas need not be picklable
+    # timing: the workers time local_solve with a Timing of the same settings
+    assert(f is not None)
+    ctx = mp.get_context('fork')
+    return(ProcessPoolExecutor(max_workers = n_workers, mp_context = ctx, initializer = init_worker, initargs = (f, vectorized, counter, budget, timing)))
+
+# classes
+class FctPool:
+    # process pool evaluating the objective f it was created with, usable as Cma/MultiModalMinimizer executor
+    def __init__(self, f = None, n_workers = None):
+        assert(f is not None)
+        self.f = f
+        self.pool = process_pool(f = f, n_workers = n_workers)
+
+    def map(self, f, x):
+        assert(f is self.f)
+        return(self.pool.map(evaluate, x))
+
+    def shutdown(self):
+        self.pool.shutdown()
+
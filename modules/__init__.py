@@ -1 +1,6 @@
-from modules.hq import hq_run_n
+# hq needs hyperqueue, imported on first use so that modules.timing works without it
+def __getattr__(name):
+    if name in ['hq_run_n', 'hq_iter_n', 'hq_write_result', 'HqResult']:
+        import modules.hq
+        return(getattr(modules.hq, name))
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
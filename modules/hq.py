@@ -1,15 +1,24 @@
 # libs
 import os
+import sys
 import shutil
+import json
+import queue
+import threading
+from collections import namedtuple
 from hyperqueue import LocalCluster
 from hyperqueue.cluster import WorkerConfig
 from hyperqueue import Job
+from hyperqueue.ffi.protocol import ResourceRequest
 import re
 
 # config
 hq_tmp_dir = '.hq_tmp'
 rm_hq_tmp_dir = False
 
+# result of a task of hq_iter_n, value is the json content of its result file
+HqResult = namedtuple('HqResult', ['task', 'ok', 'value', 'error'])
+
 # functions
 def all_int(s):
     r = [int(ss) for ss in s.split() if ss.isdigit()]
@@ -43,7 +52,35 @@ def last_int(s):
     r = all_int(s)
     return(r[-1])
 
-def hq_run_n(cmd = None, n = 0, pp = None):
+def hq_cluster(n_workers = 1, cores = None):
+    # local cluster of n_workers workers with cores cores each, all cores if None
+    cluster = LocalCluster()
+    for w in range(n_workers):
+        cluster.start_worker(WorkerConfig(cores = cores))
+    return(cluster)
+
+def hq_cmds(cmd, n):
+    # n copies of cmd, or the list of commands cmd
+    if isinstance(cmd, str):
+        assert(n > 0)
+        return([cmd] * n)
+    assert(len(cmd) > 0)
+    return(list(cmd))
+
+def hq_job(cmd = None, n = 0, cpus = 1, resources = None):
+    # one job of n tasks running cmd with the same arguments and environment, a task finds its
+    # index in HQ_TASK_ID; cpus and resources (name: amount) are requested by every task
+    # cmd may also be a list of commands, one task each, started in the order of the list
+    # max_fails = None: failed tasks do not cancel the rest of the job (hyperqueue's default is one)
+    cmds = hq_cmds(cmd, n)
+    job = Job(max_fails = None)
+    request = ResourceRequest(cpus = cpus, resources = None if resources is None else dict(resources))
+    env = {'HQ_RESULT_DIR': os.path.abspath(hq_tmp_dir)}
+    for k, c in enumerate(cmds):
+        job.program(["/usr/bin/sh", "-c", c], env = env, stdout = f'{hq_tmp_dir}/out_{k}', stderr = f'{hq_tmp_dir}/stderr_{k}', resources = request, priority = len(cmds) - k)
+    return(job)
+
+def hq_run_n(cmd = None, n = 0, pp = None, n_workers = 1, cores = None, cpus = 1, resources = None):
     assert(cmd is not None)
     assert(n > 0)
 
@@ -52,25 +89,21 @@ def hq_run_n(cmd = None, n = 0, pp = None):
     os.mkdir(hq_tmp_dir)
 
     # hq 
-    with LocalCluster() as cluster:
-        cluster.start_worker()
+    with hq_cluster(n_workers = n_workers, cores = cores) as cluster:
         client = cluster.client()
-        job = Job()
-        for k in range(n):
-            job_name = f'{hq_tmp_dir}/job_{k}'
-            with open(job_name , mode='w') as f:
-                f.write(f'{cmd} > {hq_tmp_dir}/out_{k}')
-            job.program(["/usr/bin/sh", job_name], stdout = f'{hq_tmp_dir}/stdout_{k}', stderr = f'{hq_tmp_dir}/stderr_{k}')
-        submitted = client.submit(job)
-        client.wait_for_jobs([submitted])
-
-    # collecting output
+        submitted = client.submit(hq_job(cmd = cmd, n = n, cpus = cpus, resources = resources))
+        client.wait_for_jobs([submitted], raise_on_error = False)
+        failed = client.get_failed_tasks(submitted)
+
+    # collecting output, failed tasks and tasks without output (cancelled or not run) are reported and skipped
     r = []
     for k in range(n):
-        fn = f'{hq_tmp_dir}/out_{k}'
-        while(True):
-            if os.path.getsize(fn) > 0:
-                break
+        if k in failed:
+            print(f'hq task {k} failed: {failed[k].error}, stderr: {failed[k].stderr}', file = sys.stderr)
+            continue
+        if not os.path.exists(f'{hq_tmp_dir}/out_{k}'):
+            print(f'hq task {k} not run: no output', file = sys.stderr)
+            continue
         with open(f'{hq_tmp_dir}/out_{k}', mode='r') as f:
             s = f.read()
             r += [" ".join(s.split())]
@@ -91,6 +124,71 @@ def hq_run_n(cmd = None, n = 0, pp = None):
     r = [pp(s) for s in r]
     return(r)
 
+def hq_result_file(k):
+    return(os.path.join(os.path.abspath(hq_tmp_dir), f'result_{k}.json'))
+
+def hq_write_result(value):
+    # in a task of hq_iter_n: write value as json to the task's result file, complete or not at all
+    fn = os.path.join(os.environ['HQ_RESULT_DIR'], f'result_{os.environ["HQ_TASK_ID"]}.json')
+    with open(fn + '.tmp', mode='w') as f:
+        json.dump(value, f)
+    os.replace(fn + '.tmp', fn)
 
+def hq_iter_n(cmd = None, n = 0, n_workers = 1, cores = None, cpus = 1, resources = None):
+    # run cmd n times, or each command of the list cmd once, each run writes its result with hq_write_result;
+    # yields an HqResult per task as the tasks finish, failed tasks, tasks not run and tasks without a result file after the job has finished
+    assert(cmd is not None)
+    n = len(hq_cmds(cmd, n))
+
+    # create empty .hq_tmp
+    shutil.rmtree(hq_tmp_dir, ignore_errors=True)
+    os.mkdir(hq_tmp_dir)
 
+    # hq
+    with hq_cluster(n_workers = n_workers, cores = cores) as cluster:
+        client = cluster.client()
+        submitted = client.submit(hq_job(cmd = cmd, n = n, cpus = cpus, resources = resources))
+
+        # wait in a thread, every progress report of hq wakes up the collection below; the public
+        # Client.wait_for_jobs has no progress callback, so this uses the internal connection of
+        # hyperqueue 0.26.2 (callback with {job_id: counts} about once a second), check on upgrades
+        progress = queue.Queue()
+        def wait():
+            try:
+                client.connection.wait_for_jobs([submitted.id], lambda jobs: progress.put(None))
+                progress.put(True)
+            except Exception as e:
+                progress.put(e)
+        thread = threading.Thread(target = wait, daemon = True)
+        thread.start()
+
+        # collect result files as they appear, one directory listing per progress report
+        pending = set(range(n))
+        done = False
+        while not done:
+            msg = progress.get()
+            if isinstance(msg, Exception):
+                raise msg
+            done = msg is True
+            names = [s for s in os.listdir(hq_tmp_dir) if s.startswith('result_') and s.endswith('.json')]
+            for k in sorted(pending.intersection(int(s[7:-5]) for s in names)):
+                pending.remove(k)
+                with open(hq_result_file(k), mode='r') as f:
+                    value = json.load(f)
+                yield HqResult(k, True, value, None)
+        thread.join()
+
+        # failed tasks, tasks that did not run (no output) and tasks that ran without writing a result
+        failed = client.get_failed_tasks(submitted)
+        for k in sorted(pending):
+            if k in failed:
+                error = failed[k].error
+            elif not os.path.exists(f'{hq_tmp_dir}/out_{k}'):
+                error = 'not run'
+            else:
+                error = 'no result file'
+            yield HqResult(k, False, None, error)
 
+    # rm .hq_tmp
+    if rm_hq_tmp_dir:
+        shutil.rmtree(hq_tmp_dir, ignore_errors=True)
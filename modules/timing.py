@@ -1,55 +1,194 @@
 # libs
-from time import time 
-from tabulate import tabulate
-import pandas as pd
-import re
+import os
+import json
+import threading
+from time import time, perf_counter
+from functools import wraps
 
 # classes
+class NullScope:
+    # scope of a disabled Timing, does nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        return(False)
+
+NULL_SCOPE = NullScope()
+
+class Scope:
+    # timed scope, nested in the scope open in the same thread: its path is the parent path + '/' + name
+    __slots__ = ('timing', 'name', 'path', 't0')
+
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
+
+    def __enter__(self):
+        stack = self.timing.stack()
+        self.path = self.name if len(stack) == 0 else stack[-1] + '/' + self.name
+        stack.append(self.path)
+        self.t0 = perf_counter()
+        return(self)
+
+    def __exit__(self, *args):
+        dt = perf_counter() - self.t0
+        self.timing.stack().pop()
+        self.timing.record(self.path, self.t0, dt)
+        return(False)
+
 class Timing:
-    def __init__(self):
-        self.t = {}
-        self.r = {}
-        self.start_time = time()
+    # scopes: with timing.scope('name'): ... or @timing.timed('name'), nested per thread
+    # stats: path -> [count, total, min, max] in seconds, shared by all threads, merged from other processes with merge
+    # trace: keep every scope as an event for to_chrome_trace
+    # enabled = False: scope returns a no-op and timed calls the function directly
+    def __init__(self, enabled = True, trace = False):
+        self.enabled = enabled
+        self.trace = trace
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.events = []
+            self.t = {}
+            self.start_time = time()
+            self.t_origin = perf_counter()
+
+    def enable(self, trace = None):
+        self.enabled = True
+        if trace is not None:
+            self.trace = trace
+
+    def disable(self):
+        self.enabled = False
+
+    def stack(self):
+        # open scopes of the calling thread
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return(stack)
 
+    def record(self, path, t0, dt):
+        with self.lock:
+            s = self.stats.get(path)
+            if s is None:
+                self.stats[path] = [1, dt, dt, dt]
+            else:
+                s[0] += 1
+                s[1] += dt
+                if dt < s[2]:
+                    s[2] = dt
+                if dt > s[3]:
+                    s[3] = dt
+            if self.trace:
+                self.events.append((path, t0, dt, os.getpid(), threading.get_ident()))
+
+    def scope(self, name):
+        if not self.enabled:
+            return(NULL_SCOPE)
+        return(Scope(self, name))
+
+    def timed(self, name = None):
+        def decorator(fct):
+            tag = name if name is not None else fct.__qualname__
+            @wraps(fct)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return(fct(*args, **kwargs))
+                with Scope(self, tag):
+                    return(fct(*args, **kwargs))
+            return(wrapper)
+        return(decorator)
+
+    # flat tags with manual start and stop, as before
     def start(self, s):
-        if self.existing(s):
-            assert(self.running(s) == False)
-            self.t[s] -= time()
-        else:
-            self.t[s] = -time()
-        self.r[s] = True
+        if self.enabled:
+            assert(not self.running(s))
+            self.t[s] = perf_counter()
 
     def stop(self, s):
-        assert(self.existing(s))
-        self.t[s] += time()
-        self.r[s] = False
+        if self.enabled:
+            assert(self.running(s))
+            t0 = self.t.pop(s)
+            self.record(s, t0, perf_counter() - t0)
 
     def existing(self, s):
-        return(s in self.r.keys())
+        return(s in self.stats or s in self.t)
 
     def running(self, s):
-        assert(s in self.r.keys())
-        return(self.r[s])
+        return(s in self.t)
 
-    def __str__(self):
-        total_time = time() - self.start_time
-        tags = []
-        times_sec = []
-        times_per = []
-        for k in self.t.keys():
-            if not self.running(k):
-                tags += [k]
-                times_sec += [self.t[k]]
-                times_per += [100 * self.t[k] / total_time]
-        df = pd.DataFrame({'tag' : tags, 'time[s]': times_sec, 'time[%]': times_per})
-        s = tabulate(df, headers = 'keys', tablefmt = 'psql', showindex=False)
-        s1 = s.splitlines()[0]
-        s2 = ''.join([' ']*(len(s1)-9)) + '|\n'
-        s = s1 + '\n| timing' + s2 + s
+    # aggregation over processes
+    def get_state(self):
+        with self.lock:
+            return({'stats': {k: list(v) for k, v in self.stats.items()}, 'events': list(self.events)})
+
+    def merge(self, state):
+        with self.lock:
+            for path, (count, total, t_min, t_max) in state['stats'].items():
+                s = self.stats.get(path)
+                if s is None:
+                    self.stats[path] = [count, total, t_min, t_max]
+                else:
+                    s[0] += count
+                    s[1] += total
+                    s[2] = min(s[2], t_min)
+                    s[3] = max(s[3], t_max)
+            if self.trace:
+                self.events += state['events']
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        del state['local']
+        return(state)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    # export
+    def as_dict(self):
+        with self.lock:
+            scopes = {path: {'count': s[0], 'total': s[1], 'mean': s[1] / s[0], 'min': s[2], 'max': s[3]} for path, s in self.stats.items()}
+        return({'wall': time() - self.start_time, 'scopes': scopes})
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent = 1)
+
+    def to_chrome_trace(self, path):
+        # complete events ('X') in microseconds, loadable in chrome://tracing and Perfetto
+        with self.lock:
+            events = [{'name': p.rsplit('/', 1)[-1], 'cat': p, 'ph': 'X', 'ts': 1e6 * (t0 - self.t_origin), 'dur': 1e6 * dt, 'pid': pid, 'tid': tid} for p, t0, dt, pid, tid in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def __str__(self):
+        d = self.as_dict()
+        rows = [('scope', 'count', 'time[s]', 'time[%]', 'mean[ms]', 'min[ms]', 'max[ms]')]
+        for path in sorted(d['scopes']):
+            s = d['scopes'][path]
+            name = '  ' * path.count('/') + path.rsplit('/', 1)[-1]
+            rows += [(name, str(s['count']), f'{s["total"]:.4f}', f'{100 * s["total"] / d["wall"]:.1f}', f'{1e3 * s["mean"]:.4f}', f'{1e3 * s["min"]:.4f}', f'{1e3 * s["max"]:.4f}')]
+        width = [max(len(r[k]) for r in rows) for k in range(len(rows[0]))]
+        line = '+-' + '-+-'.join('-' * w for w in width) + '-+'
+        fmt = lambda r: '| ' + ' | '.join(r[0].ljust(width[0]) if k == 0 else r[k].rjust(width[k]) for k in range(len(r))) + ' |'
+        s = line + '\n| timing' + ' ' * (len(line) - 9) + '|\n' + line + '\n' + fmt(rows[0]) + '\n' + line + '\n'
+        for r in rows[1:]:
+            s += fmt(r) + '\n'
+        s += line
         return(s)
 
 # global variables
 t = Timing()
 
-
+# disabled timing, the default of instrumented code
+NO_TIMING = Timing(enabled = False)
@@ -5,6 +5,7 @@
 #      email: m_(DOT)_epitropakis_(AT)_lancaster_(DOT)_ac_(DOT)_uk 
 ###############################################################################
 from scipy.spatial.distance import pdist, squareform
+from scipy.spatial import cKDTree
 import numpy as np
 import math
 from modules_cec13.functions import *
@@ -20,6 +21,9 @@ class CEC2013(object):
 			4:himmelblau, 5:six_hump_camel_back, 6:shubert, 7:vincent, 8:shubert, 9:vincent,
 			10:modified_rastrigin_all, 11:CF1, 12:CF2, 13:CF3, 14:CF3, 15:CF4, 16:CF3, 
 			17:CF4, 18:CF3, 19:CF4, 20:CF4}
+	__batch_functions_ = {1:five_uneven_peak_trap_batch, 2:equal_maxima_batch, 3:uneven_decreasing_maxima_batch,
+			4:himmelblau_batch, 5:six_hump_camel_back_batch, 6:shubert_batch, 7:vincent_batch, 8:shubert_batch,
+			9:vincent_batch, 10:modified_rastrigin_all_batch}
 	__f_ = None
 	__fopt_ = [200.0, 1.0, 1.0, 200.0, 1.031628453489877, 186.7309088310239, 1.0, 2709.093505572820, 1.0, -2.0, 
 				0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0 ]
@@ -45,6 +49,15 @@ class CEC2013(object):
 		else:
 			return self.__f_.evaluate(x)
 
+	def evaluate_batch(self, X):
+		# X: N, D
+		X = np.asarray(X, dtype = float)
+		assert (X.ndim == 2 and X.shape[1] == self.get_dimension())
+		if (self.__nfunc_ > 0 and self.__nfunc_ < 11): 
+			return self.__batch_functions_[self.__nfunc_](X)
+		else:
+			return self.__f_.evaluate_batch(X)
+
 	def get_lbound(self, n):
 		assert (n >= 0 and n <self.__dimensions_[self.__nfunc_-1])
 		result = 0
@@ -165,3 +178,46 @@ def find_seeds_indices(sorted_pop, radius):
 
 	return seeds_idx
 
+ACCURACIES = [1e-1, 1e-2, 1e-3, 1e-4, 1e-5]
+
+def how_many_goptima_all(pop, f, accuracies = ACCURACIES):
+	# how_many_goptima for several accuracy levels: one batched evaluation and one seed search
+	# returns the counts (array) and the seeds (list of arrays), one per accuracy level
+	NP, D = pop.shape[0], pop.shape[1]
+	if NP == 0:
+		return np.zeros(len(accuracies), dtype = int), [np.zeros((0, D)) for acc in accuracies]
+
+	# Evaluate and sort population, descending
+	fits = f.evaluate_batch(pop)
+	order = np.argsort(fits)[::-1]
+	sorted_pop = pop[order,:]
+	spopfits = fits[order]
+
+	# seeds (indices, ascending) and the distance of their fitness to the global optimum
+	seeds_idx = find_seeds_indices_tree(sorted_pop, f.get_rho())
+	err = np.abs(spopfits[seeds_idx] - f.get_fitness_goptima())
+
+	# |F_seed - F_goptimum| <= accuracy, at most no_goptima seeds
+	counts = np.zeros(len(accuracies), dtype = int)
+	seeds = []
+	for k, accuracy in enumerate(accuracies):
+		goidx = seeds_idx[err <= accuracy][:f.get_no_goptima()]
+		counts[k] = goidx.shape[0]
+		seeds.append(sorted_pop[goidx])
+
+	return counts, seeds
+
+def find_seeds_indices_tree(sorted_pop, radius):
+	# find_seeds_indices with a kd-tree: each seed covers the points within radius, the next seed
+	# is the first point not covered by an earlier seed
+	tree = cKDTree(sorted_pop)
+	covered = np.zeros(sorted_pop.shape[0], dtype = bool)
+	seeds_idx = []
+	i = 0
+	while i < sorted_pop.shape[0]:
+		seeds_idx.append(i)
+		covered[tree.query_ball_point(sorted_pop[i], radius)] = True
+		while i < sorted_pop.shape[0] and covered[i]:
+			i += 1
+
+	return np.array(seeds_idx, dtype = int)
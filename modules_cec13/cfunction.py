@@ -27,6 +27,8 @@ class CFunction(object):
 	__fmaxi_ = None
 	__tmpx_ = None
 	__function_ = None
+	__W_ = None
+	__b_ = None
 
 	def __init__(self, dim, nofunc):
 		self.__dim_ = dim
@@ -34,6 +36,17 @@ class CFunction(object):
 
 	def evaluate(self, x): 
 		pass
+
+	def evaluate_batch(self, X, chunk = 2048):
+		# X: N, D, evaluated in chunks to bound the (N, nofunc, D) intermediates
+		X = np.atleast_2d(np.asarray(X, dtype = float))
+		assert (X.shape[1] == self.__dim_)
+		if self.__W_ is None:
+			self.__prepare_batch()
+		res = np.zeros(X.shape[0])
+		for k in range(0, X.shape[0], chunk):
+			res[k:k+chunk] = self.__evaluate_inner_batch_(X[k:k+chunk])
+		return res
 	
 	def get_lbound(self, ivar):
 		assert (ivar >= 0 and ivar < self.__dim_), ["ivar is not in valid variable range: %d not in [0,%d]" % ivar,self.__dim_]
@@ -58,6 +71,38 @@ class CFunction(object):
 			tmpsum[i] = self.__weight_[i] * (self.__C_ * self.__fi_[i] / self.__fmaxi_[i] + self.__bias_[i])
 		return sum(tmpsum) * MINMAX + self.__f_bias_
 
+	def __prepare_batch(self):
+		if self.__function_ == None:
+			raise NameError('Composition functions\' dict is uninitialized')
+		# z_i = ((x - o_i)/\lambda_i) M_i = x W_i - b_i with W_i = M_i/\lambda_i, b_i = o_i W_i
+		self.__W_ = np.array([ self.__M_[i] / self.__lambda_[i] for i in range(self.__nofunc_) ])
+		self.__b_ = np.einsum('kd,kde->ke', self.__O_, self.__W_)
+		# components grouped by basic function
+		self.__groups_ = {}
+		for i in range(self.__nofunc_):
+			self.__groups_.setdefault(BATCH_FUNCTIONS[self.__function_[i]], []).append(i)
+
+	def __evaluate_inner_batch_(self, X):
+		N = X.shape[0]
+		K = self.__nofunc_
+
+		# weights
+		d2 = np.sum( (X[:, None, :] - self.__O_[None, :, :])**2, axis = 2 )
+		w = np.exp( -d2/(2.0 * self.__dim_ * self.__sigma_ * self.__sigma_) )
+		maxw = np.max(w, axis = 1, keepdims = True)
+		w = np.where(w != maxw, w * (1.0 - maxw**10), w)
+		mysum = np.sum(w, axis = 1, keepdims = True)
+		w = np.where(mysum == 0.0, 1.0 / K, w / np.where(mysum == 0.0, 1.0, mysum))
+
+		# all components for all points
+		Z = np.einsum('nd,kde->nke', X, self.__W_) - self.__b_[None, :, :]
+		fi = np.zeros((N, K))
+		for fct, idx in self.__groups_.items():
+			fi[:, idx] = fct( Z[:, idx, :].reshape(-1, self.__dim_) ).reshape(N, len(idx))
+
+		tmpsum = w * (self.__C_ * fi / self.__fmaxi_ + self.__bias_)
+		return np.sum(tmpsum, axis = 1) * MINMAX + self.__f_bias_
+
 	def __calculate_weights(self, x):
 		self.__weight_ = np.zeros(self.__nofunc_)
 		for i in range(self.__nofunc_):
@@ -173,3 +218,38 @@ def FEF8F2(x):
     f += F8F2( x[ [D-1,0] ] + 1 )
     return f
 
+###############################################################################
+# Batch versions of the basic functions, X is (N, D)
+###############################################################################
+def FSphere_batch(X):
+    return np.sum(X**2, axis = 1)
+
+def FRastrigin_batch(X):
+    return np.sum( X**2-10.*np.cos( 2.*np.pi*X )+10, axis = 1)
+
+def FGrienwank_batch(X):
+    i = np.sqrt(np.arange(X.shape[1])+1.0)
+    return np.sum(X**2, axis = 1)/4000.0 - np.prod(np.cos(X/i), axis = 1) + 1.0
+
+def FWeierstrass_batch(X):
+    alpha = 0.5
+    beta = 3.0
+    kmax = 20
+    D = X.shape[1]
+
+    c1 = alpha**np.arange(kmax+1)
+    c2 = 2.0*np.pi*beta**np.arange(kmax+1)
+    c = -D*np.sum(c1*np.cos(c2*0.5))
+    f = np.cos(c2[None, None, :]*(X[:, :, None]+0.5)) @ c1
+    return np.sum(f, axis = 1) + c
+
+def F8F2_batch(x0, x1):
+    f2 = 100.0 * ( x0**2 - x1 )**2 + (1.0 - x0)**2
+    return 1.0 + (f2**2)/4000.0 - np.cos(f2)
+
+def FEF8F2_batch(X):
+    Y = X + 1
+    return np.sum(F8F2_batch(Y, np.roll(Y, -1, axis = 1)), axis = 1)
+
+BATCH_FUNCTIONS = {FSphere:FSphere_batch, FRastrigin:FRastrigin_batch, FGrienwank:FGrienwank_batch,
+                   FWeierstrass:FWeierstrass_batch, FEF8F2:FEF8F2_batch}
@@ -159,3 +159,70 @@ def modified_rastrigin_all(x = None):
 	for i in range (0, D):
 		result += (10 + 9*math.cos(2*math.pi*k[i]*x[i]))        
 	return -result
+
+###############################################################################
+# Batch versions: X is (N, D), one value per row. Terms are accumulated in the
+# same order as in the scalar functions above, results are identical. Scalar
+# powers and math.log go through libm, so do the batch versions.
+###############################################################################
+def libm_log(x):
+	return np.fromiter(map(math.log, x), float, x.shape[0])
+
+def five_uneven_peak_trap_batch(X):
+	x = X[:, 0]
+	condlist = [(x >= 0) & (x < 2.5), (x >= 2.5) & (x < 5), (x >= 5.0) & (x < 7.5), (x >= 7.5) & (x < 12.5),
+		(x >= 12.5) & (x < 17.5), (x >= 17.5) & (x < 22.5), (x >= 22.5) & (x < 27.5), (x >= 27.5) & (x <= 30)]
+	choicelist = [80*(2.5-x), 64*(x-2.5), 64*(7.5-x), 28*(x-7.5), 28*(17.5-x), 32*(x-17.5), 32*(27.5-x), 80*(x-27.5)]
+	return np.select(condlist, choicelist, default = np.nan)
+
+def equal_maxima_batch(X):
+	return np.sin(5.0 * np.pi * X[:, 0])**6
+
+def uneven_decreasing_maxima_batch(X):
+	x = X[:, 0]
+	return np.exp(-2.0*np.log(2)*((x-0.08)/0.854)**2)*(np.sin(5*np.pi*(x**0.75-0.05)))**6
+
+def himmelblau_batch(X):
+	x2 = np.float_power(X[:, 0], 2)
+	y2 = np.float_power(X[:, 1], 2)
+	return 200 - np.float_power(x2 + X[:, 1] - 11, 2) - np.float_power(X[:, 0] + y2 - 7, 2)
+
+def six_hump_camel_back_batch(X):
+	x2 = np.float_power(X[:, 0], 2)
+	x4 = np.float_power(X[:, 0], 4)
+	y2 = np.float_power(X[:, 1], 2)
+	expr1 = (4.0 - 2.1*x2 + x4/3.0)*x2
+	expr2 = X[:, 0]*X[:, 1]
+	expr3 = (4.0*y2 - 4.0)*y2
+	return -1.0*(expr1+expr2+expr3)
+
+def shubert_batch(X):
+	result = np.ones(X.shape[0])
+	for i in range(X.shape[1]):
+		soma = np.zeros(X.shape[0])
+		for j in range(1, 6):
+			soma = soma + j*np.cos((j+1)*X[:, i]+j)
+		result = result*soma
+	return -result
+
+def vincent_batch(X):
+	D = X.shape[1]
+	x = np.maximum(X, 0.25)
+	result = np.zeros(X.shape[0])
+	for i in range(D):
+		result += np.sin(10*libm_log(x[:, i]))/D
+	return result
+
+def modified_rastrigin_all_batch(X):
+	D = X.shape[1]
+	if D==2:
+		k = [3, 4]
+	elif D==8:
+		k = [1, 2, 1, 2, 1, 3, 1, 4]
+	elif D==16:
+		k = [1, 1, 1, 2, 1, 1, 1, 2, 1, 1, 1, 3, 1, 1, 1, 4]
+
+	result = np.zeros(X.shape[0])
+	for i in range(D):
+		result += (10 + 9*np.cos(2*np.pi*k[i]*X[:, i]))
+	return -result